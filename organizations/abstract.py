@@ -26,8 +26,9 @@
 import warnings
 
 from django.conf import settings
+from django.contrib.auth import get_user_model
 from django.core.urlresolvers import reverse
-from django.db import models
+from django.db import models, transaction
 from django.utils.translation import ugettext_lazy as _
 try:
     import six
@@ -46,6 +47,20 @@ if ORGS_TIMESTAMPED_MODEL:
                   DeprecationWarning)
 
 
+def user_pks(users):
+    """
+    Returns the distinct primary keys of the given users, in order. Users may
+    be given as instances or as primary keys (including strings from forms).
+    """
+    pks, seen = [], set()
+    for user in users:
+        pk = int(getattr(user, 'pk', user))
+        if pk not in seen:
+            seen.add(pk)
+            pks.append(pk)
+    return pks
+
+
 class SharedBaseModel(models.Model):
     """
     Adds fields ``created`` and ``modified`` and
@@ -113,6 +128,41 @@ class AbstractOrganization(six.with_metaclass(OrgMeta, SharedBaseModel, Abstract
         user_added.send(sender=self, user=user)
         return org_user
 
+    def add_users(self, users, is_admin=False):
+        """
+        Adds many users at once using a constant number of queries. `users`
+        may be user instances or primary keys.
+
+        Returns a dictionary mapping each user primary key to "added",
+        "existing" or "missing". If the organization has no users the first
+        new user is made an admin and the owner, as with `add_user`.
+        """
+        pks = user_pks(users)
+        found = get_user_model().objects.in_bulk(pks)
+        outcomes = dict((pk, 'added' if pk in found else 'missing') for pk in pks)
+        with transaction.atomic():
+            existing = set(self._org_user_model.objects.filter(
+                organization=self, user_id__in=list(found)).values_list('user_id', flat=True))
+            new_users = [found[pk] for pk in pks if pk in found and pk not in existing]
+            if new_users and not self._org_user_model.objects.filter(organization=self).exists():
+                org_user = self._org_user_model.objects.create(user=new_users[0],
+                                                               organization=self,
+                                                               is_admin=True)
+                self._org_owner_model.objects.create(organization=self,
+                                                     organization_user=org_user)
+                new_users = new_users[1:]
+            self._org_user_model.objects.bulk_create([
+                self._org_user_model(user=user, organization=self, is_admin=is_admin)
+                for user in new_users])
+        for pk in existing:
+            outcomes[pk] = 'existing'
+
+        for pk in pks:
+            if outcomes[pk] == 'added':
+                # User added signal
+                user_added.send(sender=self, user=found[pk])
+        return outcomes
+
     def remove_user(self, user):
         """
         Deletes a user from an organization.
@@ -124,6 +174,35 @@ class AbstractOrganization(six.with_metaclass(OrgMeta, SharedBaseModel, Abstract
         # User removed signal
         user_removed.send(sender=self, user=user)
 
+    def remove_users(self, users):
+        """
+        Deletes many users from an organization with a single DELETE. The
+        owner is never removed.
+
+        Returns a dictionary mapping each user primary key to "removed",
+        "owner" or "not_member".
+        """
+        pks = user_pks(users)
+        memberships = self._org_user_model.objects.filter(organization=self, user_id__in=pks)
+        member_pks = set(memberships.values_list('user_id', flat=True))
+        owner_pks = set(self._org_owner_model.objects.filter(
+            organization=self).values_list('organization_user__user_id', flat=True))
+        memberships.exclude(user_id__in=owner_pks).delete()
+
+        outcomes = {}
+        for pk in pks:
+            if pk in owner_pks and pk in member_pks:
+                outcomes[pk] = 'owner'
+            elif pk in member_pks:
+                outcomes[pk] = 'removed'
+            else:
+                outcomes[pk] = 'not_member'
+        removed = [pk for pk in pks if outcomes[pk] == 'removed']
+        for user in get_user_model().objects.filter(pk__in=removed):
+            # User removed signal
+            user_removed.send(sender=self, user=user)
+        return outcomes
+
     def get_or_add_user(self, user, **kwargs):
         """
         Adds a new user to the organization, and if it's the first user makes
@@ -0,0 +1,210 @@
+"""
+Statistics for an organization's progress through an activity, computed
+from the TinCan activity states stored in Mongo.
+
+Progress and scores are split into four quartile buckets (0-25%, 25-50%,
+50-75% and 75-100%). The buckets are counted by an aggregation pipeline so
+only the counts leave the database; servers or mocks without `$bucket`
+support fall back to counting in Python, vectorized with NumPy when it is
+installed.
+"""
+from __future__ import division
+from __future__ import unicode_literals
+from bisect import bisect_right
+from datetime import date, datetime
+
+from dateutil.relativedelta import relativedelta
+from django.contrib.sites.models import Site
+from django.utils import timezone
+from django.utils.timezone import utc
+from pymongo.errors import OperationFailure
+
+from mycoracle import models as mycoracle_models
+from mycoracle import utils as mycoracle_utils
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from . import app_settings
+from .models import ActivityStatistics
+from .utils import map_concurrently
+
+BOUNDARIES = [0, 0.25, 0.5, 0.75]
+
+
+def bucket(value):
+    """Returns the index of the quartile bucket for a fraction"""
+    return max(bisect_right(BOUNDARIES, value) - 1, 0)
+
+
+def states_query(activity_url, user_ids):
+    """Matches the members' progress states that have at least one statement"""
+    return {
+        "stateId": "progress-by-id",
+        "activityId": activity_url,
+        "agent.account.name": {"$in": list(user_ids)},
+        "state.0": {"$exists": True},
+    }
+
+
+def progress_pipeline(activity_url, user_ids, statements):
+    return [
+        {"$match": states_query(activity_url, user_ids)},
+        {"$project": {"progress": {"$divide": [{"$size": "$state"}, statements]}}},
+        # Progress of 100% or more lands in the default bucket
+        {"$bucket": {"groupBy": "$progress", "boundaries": BOUNDARIES + [1], "default": 1,
+                     "output": {"count": {"$sum": 1}}}},
+    ]
+
+
+def scores_pipeline(activity_url, user_ids, testees):
+    score = "$state.verbs.result.score.scaled"
+    branches = [{"case": {"$lt": [score, boundary]}, "then": index}
+                for index, boundary in enumerate(BOUNDARIES[1:])]
+    return [
+        {"$match": dict(states_query(activity_url, user_ids), **{"state.id": {"$in": list(testees)}})},
+        {"$project": {"state.id": 1, "state.verbs.result.score.scaled": 1}},
+        {"$unwind": "$state"},
+        {"$match": {"state.id": {"$in": list(testees)}}},
+        {"$unwind": "$state.verbs"},
+        {"$match": {"state.verbs.result.score.scaled": {"$exists": True}}},
+        {"$group": {
+            "_id": {"id": "$state.id", "bucket": {"$switch": {"branches": branches,
+                                                             "default": len(BOUNDARIES) - 1}}},
+            "count": {"$sum": 1}}},
+    ]
+
+
+def aggregate_histograms(collection, activity_url, user_ids, statements, testees):
+    progress = [0] * len(BOUNDARIES)
+    for row in collection.aggregate(progress_pipeline(activity_url, user_ids, statements)):
+        progress[bucket(row["_id"])] += row["count"]
+    scores = dict((testee, [0] * len(BOUNDARIES)) for testee in testees)
+    if testees:
+        for row in collection.aggregate(scores_pipeline(activity_url, user_ids, testees)):
+            scores[row["_id"]["id"]][row["_id"]["bucket"]] += row["count"]
+    return progress, scores
+
+
+def count_buckets(values):
+    """Returns the number of values in each bucket"""
+    if numpy is not None:
+        indexes = numpy.searchsorted(BOUNDARIES, numpy.asarray(values, dtype=float), side='right') - 1
+        return numpy.bincount(numpy.clip(indexes, 0, len(BOUNDARIES) - 1), minlength=len(BOUNDARIES)).tolist()
+    counts = [0] * len(BOUNDARIES)
+    for value in values:
+        counts[bucket(value)] += 1
+    return counts
+
+
+def count_histograms(documents, statements, testees):
+    """
+    Counts the buckets for activity state documents in memory. The progress
+    ratios and each testee's scores are collected first, looking testees up
+    in a dictionary, then bucketed together.
+    """
+    scores = dict((testee, []) for testee in testees)
+    ratios = []
+    for document in documents:
+        ratios.append(len(document["state"]) / statements)
+        for state in document["state"]:
+            testee = scores.get(state["id"])
+            if testee is None:
+                continue
+            for verb in state.get("verbs", []):
+                result = verb.get("result")
+                if result:
+                    testee.append(result["score"]["scaled"])
+    return count_buckets(ratios), dict((testee, count_buckets(values)) for testee, values in scores.items())
+
+
+def python_histograms(collection, activity_url, user_ids, statements, testees):
+    states = collection.find(states_query(activity_url, user_ids),
+                             {"state.id": 1, "state.verbs.result": 1})
+    return count_histograms(states, statements, testees)
+
+
+def activity_histograms(collection, activity_url, user_id_chunks, statements, testees):
+    """
+    Returns the number of members in each progress bucket, and a dictionary
+    of the number of scores in each bucket by testee id.
+
+    `user_id_chunks` yields lists of member ids, each queried separately
+    and the counts added up, as from `Organization.member_id_chunks`.
+    `statements` is the number of statements in the activity's profile and
+    `testees` the ids of its scored statements.
+    """
+    progress = [0] * len(BOUNDARIES)
+    scores = dict((testee, [0] * len(BOUNDARIES)) for testee in testees)
+    if not statements:
+        return progress, scores
+    histograms = aggregate_histograms
+    for user_ids in user_id_chunks:
+        try:
+            chunk_progress, chunk_scores = histograms(collection, activity_url, user_ids, statements, testees)
+        except (OperationFailure, NotImplementedError):
+            histograms = python_histograms
+            chunk_progress, chunk_scores = histograms(collection, activity_url, user_ids, statements, testees)
+        progress = [total + count for total, count in zip(progress, chunk_progress)]
+        for testee, counts in chunk_scores.items():
+            scores[testee] = [total + count for total, count in zip(scores[testee], counts)]
+    return progress, scores
+
+
+def moderated_activities(organization, site):
+    """
+    Returns the activities the organization follows on the site, or every
+    activity on the current site if it has not chosen any.
+    """
+    try:
+        organization_activities = mycoracle_models.OrganizationActivity.objects.get(
+            site=site, organization=organization, active=True)
+    except mycoracle_models.OrganizationActivity.DoesNotExist:
+        return list(mycoracle_models.ActivityProfile.objects.filter(siteprofile__site=Site.objects.get_current()))
+    activities = []
+    for group in organization_activities.activity_groups.all():
+        activities += list(group.activities.all())
+    return activities + list(organization_activities.activities.all())
+
+
+def month_start(value):
+    """Returns the first day of the month of a date or datetime"""
+    return date(value.year, value.month, 1)
+
+
+def closed_months(months):
+    """Returns the months, as dates, that ended before the current one"""
+    current = month_start(timezone.now())
+    return [month_start(month) for month in months if month_start(month) < current]
+
+
+def month_statistics(tcprofile, activity, organization, brand, month):
+    """Computes the activity's statistics for one month from the TinCan data"""
+    start = datetime(month.year, month.month, 1, tzinfo=utc)
+    return mycoracle_utils.GetStatistics(
+        tcProfile=tcprofile, activity=activity, organisation=organization,
+        brand=brand, monthly=True, start=start, end=start + relativedelta(months=1))
+
+
+def monthly_statistics(tcprofile, activity, organization, months, brand=None):
+    """
+    Returns the active users, average statements, average visit time and
+    tests passed series for the months, and whether every month's statistics
+    were available.
+
+    Closed months are read from the `ActivityStatistics` rollup. The others,
+    and closed months not rolled up yet, are computed concurrently from the
+    activity profile; those that failed or were not ready within the
+    dashboard timeout count as zero and make the series incomplete.
+    """
+    brand = brand or Site.objects.get_current()
+    rolled_up = dict((row.month, row) for row in ActivityStatistics.objects.filter(
+        organization=organization, activity_url=activity.url, month__in=closed_months(months)))
+    live = [month for month in months if month_start(month) not in rolled_up]
+    computed = dict(zip(live, map_concurrently(
+        lambda month: month_statistics(tcprofile, activity, organization, brand, month), live,
+        app_settings.ORGS_DASHBOARD_CONCURRENCY, app_settings.ORGS_DASHBOARD_TIMEOUT)))
+    stats = [rolled_up.get(month_start(month)) or computed[month] for month in months]
+    complete = all(stat is not None for stat in stats)
+    return [[getattr(stat, name, 0) for stat in stats] for name in ActivityStatistics.statistics], complete
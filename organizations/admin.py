@@ -39,6 +39,7 @@ class OwnerInline(BaseOwnerInline):
 
 class OrganizationAdmin(BaseOrganizationAdmin):
     inlines = [OwnerInline]
+    list_display = ['name', 'is_active', 'member_count']
 
 
 class OrganizationUserAdmin(BaseOrganizationUserAdmin):
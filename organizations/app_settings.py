@@ -12,3 +12,41 @@ ORGS_REGISTRATION_BACKEND = getattr(settings, 'REGISTRATION_BACKEND',
                                     'organizations.backends.defaults.RegistrationBackend')
 
 ORGS_EMAIL_LENGTH = model_field_attr(User, 'email', 'max_length')
+
+# Cache alias used to share membership lookups between requests. Disabled
+# when None.
+ORGS_MEMBERSHIP_CACHE = getattr(settings, 'ORGS_MEMBERSHIP_CACHE', None)
+
+ORGS_MEMBERSHIP_CACHE_TIMEOUT = getattr(settings, 'ORGS_MEMBERSHIP_CACHE_TIMEOUT', 300)
+
+# Page member lists and user pickers with opaque keyset cursors instead of
+# page numbers.
+ORGS_CURSOR_PAGINATION = getattr(settings, 'ORGS_CURSOR_PAGINATION', False)
+
+# With cursor pagination, show cheap approximate totals (or none) rather than
+# counting every matching row.
+ORGS_APPROXIMATE_TOTALS = getattr(settings, 'ORGS_APPROXIMATE_TOTALS', False)
+
+# Queue invitation and notification emails in the OutgoingEmail outbox for
+# the run_org_mail_worker command instead of sending them during the request.
+ORGS_EMAIL_OUTBOX = getattr(settings, 'ORGS_EMAIL_OUTBOX', False)
+
+# Days before an OrganizationInvitation expires
+ORGS_INVITATION_TIMEOUT_DAYS = getattr(settings, 'INVITATION_TIMEOUT_DAYS',
+                                       getattr(settings, 'REGISTRATION_TIMEOUT_DAYS', 15))
+
+# Number of activities the dashboard fetches statistics for at once, and the
+# seconds it waits before rendering the ones that are ready.
+ORGS_DASHBOARD_CONCURRENCY = getattr(settings, 'ORGS_DASHBOARD_CONCURRENCY', 8)
+
+ORGS_DASHBOARD_TIMEOUT = getattr(settings, 'ORGS_DASHBOARD_TIMEOUT', 10)
+
+# Number of member ids sent to Mongo in each dashboard query
+ORGS_MEMBER_ID_CHUNK_SIZE = getattr(settings, 'ORGS_MEMBER_ID_CHUNK_SIZE', 5000)
+
+# Cache alias used to share dashboard charts between moderators, and how
+# many seconds they are kept, since they include the current month. Disabled
+# when None.
+ORGS_DASHBOARD_CACHE = getattr(settings, 'ORGS_DASHBOARD_CACHE', None)
+
+ORGS_DASHBOARD_CACHE_TIMEOUT = getattr(settings, 'ORGS_DASHBOARD_CACHE_TIMEOUT', 300)
@@ -5,3 +5,6 @@ from django.apps import AppConfig
 class OrganizationsConfig(AppConfig):
     name = 'organizations'
     verbose_name = 'Organizations'
+
+    def ready(self):
+        from . import receivers  # noqa
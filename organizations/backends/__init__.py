@@ -24,20 +24,83 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 from __future__ import unicode_literals
-from importlib import import_module
 
-from organizations.app_settings import (ORGS_INVITATION_BACKEND,
-        ORGS_REGISTRATION_BACKEND)
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
 
+from organizations import app_settings
 
-def invitation_backend():
-    # TODO exception handling
-    class_module, class_name = ORGS_INVITATION_BACKEND.rsplit('.', 1)
-    mod = import_module(class_module)
-    return getattr(mod, class_name)()
+# The setting naming each kind of backend and its app_settings default
+BACKEND_SETTINGS = {
+    'invitation': ('INVITATION_BACKEND', 'ORGS_INVITATION_BACKEND'),
+    'registration': ('REGISTRATION_BACKEND', 'ORGS_REGISTRATION_BACKEND'),
+}
 
+# Backend classes, or their dotted paths, registered for particular sites,
+# keyed by (kind, site id)
+_site_backends = {}
 
-def registration_backend():
-    class_module, class_name = ORGS_REGISTRATION_BACKEND.rsplit('.', 1)
-    mod = import_module(class_module)
-    return getattr(mod, class_name)()
+# Backend instances keyed by (kind, site id), created on first use
+_instances = {}
+
+
+def _site_id(site):
+    """Sites without a primary key, like RequestSite, use the default backends"""
+    if site is None or isinstance(site, int):
+        return site
+    return getattr(site, 'pk', None)
+
+
+def register_backend(kind, backend, site):
+    """
+    Uses `backend`, a backend class or its dotted path, for the given kind
+    of backend ('invitation' or 'registration') on the site.
+    """
+    if kind not in BACKEND_SETTINGS:
+        raise ValueError("Unknown backend kind {0!r}".format(kind))
+    key = (kind, _site_id(site))
+    _site_backends[key] = backend
+    _instances.pop(key, None)
+
+
+def unregister_backend(kind, site):
+    key = (kind, _site_id(site))
+    _site_backends.pop(key, None)
+    _instances.pop(key, None)
+
+
+def get_backend(kind, site=None):
+    """
+    Returns the backend instance of the given kind for the site, or the
+    configured default. Backends are created once and then shared, so
+    repeated calls are a dictionary lookup.
+    """
+    key = (kind, _site_id(site))
+    try:
+        return _instances[key]
+    except KeyError:
+        pass
+    backend = _site_backends.get(key)
+    if backend is None:
+        setting_name, default_name = BACKEND_SETTINGS[kind]
+        backend = getattr(settings, setting_name, getattr(app_settings, default_name))
+    if not callable(backend):
+        backend = import_string(backend)
+    _instances[key] = instance = backend()
+    return instance
+
+
+@receiver(setting_changed)
+def clear_backends(setting, **kwargs):
+    if setting in [setting_name for setting_name, default_name in BACKEND_SETTINGS.values()]:
+        _instances.clear()
+
+
+def invitation_backend(site=None):
+    return get_backend('invitation', site)
+
+
+def registration_backend(site=None):
+    return get_backend('registration', site)
@@ -33,12 +33,15 @@ from django.conf import settings
 from django.conf.urls import url
 from django.contrib.auth import authenticate, login, get_user_model
 from django.core.urlresolvers import reverse
-from django.core.mail import EmailMessage
+from django.core.exceptions import PermissionDenied
+from django.core.mail import EmailMessage, get_connection
+from django.db.models.functions import Lower
 from django.http import Http404
 from django.shortcuts import render, redirect
 from django.template import loader
 from django.utils.translation import ugettext as _
 
+from .. import app_settings
 from ..utils import create_organization
 from ..utils import model_field_attr
 from .forms import UserRegistrationForm, OrganizationRegistrationForm
@@ -137,7 +140,55 @@ class BaseBackend(object):
     # in a custom backend.
     def _send_email(self, user, subject_template, body_template,
             sender=None, **kwargs):
-        """Utility method for sending emails to new users"""
+        """
+        Utility method for sending emails to new users. With
+        `ORGS_EMAIL_OUTBOX` the email is queued in the outbox instead.
+        """
+        message = self._build_email(user, subject_template, body_template,
+                sender, **kwargs)
+        return self._deliver([message])
+
+    def send_many(self, users, template_pair, shared_context=None, sender=None):
+        """
+        Sends the email rendered from the (subject, body) template pair to
+        each user. The templates and the sender's addresses are prepared once
+        and the shared context is reused for every user, so each message only
+        costs its own render. The messages go out over a single connection,
+        or into the outbox with `ORGS_EMAIL_OUTBOX`.
+
+        Returns the number of emails sent or queued.
+        """
+        return self._send_rendered(((user.email, {'user': user}) for user in users),
+                template_pair, shared_context, sender)
+
+    def _send_rendered(self, recipients, template_pair, shared_context=None, sender=None):
+        """
+        Sends the email rendered from the template pair to each (address,
+        context) recipient, the recipient's context updating the shared one.
+        """
+        subject_template, body_template = [self.get_email_template(name) for name in template_pair]
+        from_email, headers = self._sender_addresses(sender)
+        context = dict(shared_context or {}, sender=sender)
+        messages = []
+        for address, recipient_context in recipients:
+            context.update(recipient_context)
+            messages.append(EmailMessage(subject_template.render(context).strip(),
+                    body_template.render(context), from_email, [address],
+                    headers=dict(headers)))
+        return self._deliver(messages)
+
+    def get_email_template(self, template_name):
+        """
+        Returns the compiled template, loading and parsing it only the first
+        time this backend uses it.
+        """
+        templates = self.__dict__.setdefault('_email_templates', {})
+        if template_name not in templates:
+            templates[template_name] = loader.get_template(template_name)
+        return templates[template_name]
+
+    def _sender_addresses(self, sender=None):
+        """Returns the from address and headers for emails from the sender"""
         if sender:
             from_email = "%s %s <%s>" % (sender.first_name, sender.last_name,
                     email.utils.parseaddr(settings.DEFAULT_FROM_EMAIL)[1])
@@ -146,16 +197,30 @@ class BaseBackend(object):
         else:
             from_email = settings.DEFAULT_FROM_EMAIL
             reply_to = from_email
+        return from_email, {'Reply-To': reply_to}
 
-        headers = {'Reply-To': reply_to}
+    def _build_email(self, user, subject_template, body_template,
+            sender=None, **kwargs):
+        """Renders the email for the user as an EmailMessage"""
+        from_email, headers = self._sender_addresses(sender)
         kwargs.update({'sender': sender, 'user': user})
 
-        subject_template = loader.get_template(subject_template)
-        body_template = loader.get_template(body_template)
+        subject_template = self.get_email_template(subject_template)
+        body_template = self.get_email_template(body_template)
         subject = subject_template.render(kwargs).strip()  # Remove stray newline characters
         body = body_template.render(kwargs)
         return EmailMessage(subject, body, from_email, [user.email],
-                headers=headers).send()
+                headers=headers)
+
+    def _deliver(self, messages):
+        """Sends the messages over one connection, or queues them in the outbox"""
+        if not messages:
+            return 0
+        if app_settings.ORGS_EMAIL_OUTBOX:
+            from ..models import OutgoingEmail
+            OutgoingEmail.objects.bulk_create([OutgoingEmail.from_message(message) for message in messages])
+            return len(messages)
+        return get_connection().send_messages(messages)
 
 
 class RegistrationBackend(BaseBackend):
@@ -187,6 +252,10 @@ class RegistrationBackend(BaseBackend):
         """
         Returns a User object filled with dummy data and not active, and sends
         an invitation email.
+
+        Unlike invitations, registration keeps creating the inactive user up
+        front: the organization created alongside it needs that user as its
+        owner, and the activation link is keyed on the user's id.
         """
         try:
             user = self.user_model.objects.get(email=email)
@@ -247,6 +316,7 @@ class InvitationBackend(BaseBackend):
     notification_body = 'organizations/email/notification_body.html'
     invitation_subject = 'organizations/email/invitation_subject.txt'
     invitation_body = 'organizations/email/invitation_body.html'
+    organization_invitation_body = 'organizations/email/organization_invitation_body.html'
     reminder_subject = 'organizations/email/reminder_subject.txt'
     reminder_body = 'organizations/email/reminder_body.html'
     form_class = UserRegistrationForm
@@ -260,14 +330,81 @@ class InvitationBackend(BaseBackend):
         return [
             url(r'^(?P<user_id>[\d]+)-(?P<token>[0-9A-Za-z]{1,13}-[0-9A-Za-z]{1,20})/$',
                 view=self.activate_view, name="invitations_register"),
+            url(r'^accept/(?P<token>[0-9a-f]{32})/$',
+                view=self.accept_view, name="invitations_accept"),
         ]
 
+    def invite_many(self, emails, organization, sender=None, is_admin=False, **kwargs):
+        """
+        Invites many email addresses to the organization at once.
+
+        Existing users are added straight away and notified. Everyone else
+        gets an `OrganizationInvitation`, created in bulk, and an email with a
+        link to accept it; their user account is only created on acceptance.
+
+        Returns the added users and the invitations.
+        """
+        from ..models import OrganizationInvitation
+        emails = [email.strip().lower() for email in emails if email.strip()]
+        users = list(self.user_model.objects.annotate(email_lower=Lower('email')).filter(
+            email_lower__in=emails, is_active=True))
+        known = set(user.email.lower() for user in users)
+        outcomes = organization.add_users(users, is_admin=is_admin)
+        added = [user for user in users if outcomes[user.pk] == 'added']
+        kwargs.update({'organization': organization})
+        self.send_many(added, (self.notification_subject, self.notification_body), kwargs, sender=sender)
+        invitations = OrganizationInvitation.create_many(
+            organization, [email for email in emails if email not in known], invited_by=sender, is_admin=is_admin)
+        self.send_organization_invitations(invitations, sender, **kwargs)
+        return added, invitations
+
+    def send_organization_invitations(self, invitations, sender=None, **kwargs):
+        """Emails each invitation's link to its address"""
+        return self._send_rendered(
+            ((invitation.email, {'invitation': invitation, 'organization': invitation.organization})
+             for invitation in invitations),
+            (self.invitation_subject, self.organization_invitation_body), kwargs, sender)
+
+    def accept_view(self, request, token):
+        """
+        Accepts an invitation for the logged in user, or creates the user's
+        account from the registration form and then accepts it. Logged in
+        users can only accept invitations sent to their own email address.
+        """
+        from ..models import OrganizationInvitation
+        invitation = OrganizationInvitation.pending().filter(token=token).select_related('organization').first()
+        if invitation is None:
+            raise Http404(_("Your URL may have expired."))
+        if request.user.is_authenticated():
+            if (request.user.email or '').lower() != invitation.email:
+                raise PermissionDenied(_("This invitation was sent to another email address."))
+            invitation.accept(request.user)
+            return redirect(self.get_success_url())
+        form = self.get_form(data=request.POST or None, initial={'email': invitation.email})
+        if form.is_valid():
+            user = form.save(commit=False)
+            user.is_active = True
+            user.set_password(form.cleaned_data['password'])
+            user.save()
+            invitation.accept(user)
+            user = authenticate(username=form.cleaned_data['username'],
+                    password=form.cleaned_data['password'])
+            login(request, user)
+            return redirect(self.get_success_url())
+        return render(request, 'organizations/register_form.html',
+                {'form': form})
+
     def invite_by_email(self, email, sender=None, request=None, **kwargs):
         """Creates an inactive user with the information we know and then sends
         an invitation email for that user to complete registration.
 
         If your project uses email in a different way then you should make to
         extend this method as it only checks the `email` attribute for Users.
+
+        This method still creates a placeholder user because callers link the
+        returned user to an organization themselves. Use `invite_many` to
+        store an `OrganizationInvitation` instead and only create the user
+        when it is accepted.
         """
         try:
             user = self.user_model.objects.get(email=email)
@@ -0,0 +1,139 @@
+"""
+Optional cross-request caches of users' membership flags and of the charts
+shown on organization dashboards.
+
+Each user's flags are stored under a key that embeds a per-user version and
+a global version. Membership writes bump the user's version and organization
+writes bump the global one, so stale entries are simply never read again and
+expire on their own. Dashboard charts are versioned the same way per
+organization, bumped whenever members are added or removed.
+
+Versions are bumped when the write happens and again when its transaction
+commits, so entries a concurrent request cached from the rows as they were
+before the commit are dropped too. Django 1.8 has no commit hooks, so there
+only the first bump happens.
+"""
+from __future__ import unicode_literals
+import time
+from functools import partial
+
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import translation
+
+from organizations import app_settings
+
+GLOBAL_VERSION_KEY = 'organizations:memberships:version'
+USER_VERSION_KEY = 'organizations:memberships:version:{0}'
+FLAGS_KEY = 'organizations:memberships:{0}:{1}:{2}'
+ORGANIZATION_VERSION_KEY = 'organizations:dashboard:version:{0}'
+DASHBOARD_KEY = 'organizations:dashboard:{0}:{1}:{2}:{3}:{4}'
+
+
+def get_cache():
+    """Returns the configured membership cache, or None if it is disabled"""
+    if app_settings.ORGS_MEMBERSHIP_CACHE is None:
+        return None
+    return caches[app_settings.ORGS_MEMBERSHIP_CACHE]
+
+
+def get_dashboard_cache():
+    """Returns the configured dashboard cache, or None if it is disabled"""
+    if app_settings.ORGS_DASHBOARD_CACHE is None:
+        return None
+    return caches[app_settings.ORGS_DASHBOARD_CACHE]
+
+
+def _new_version():
+    # Versions start from the clock so that an evicted counter never
+    # restarts at a number an older cached entry was stored under.
+    return int(time.time() * 1000)
+
+
+def get_membership_flags(user_id, loader):
+    """
+    Returns the membership flags for the user from the cache, calling
+    `loader` and storing its result on a miss.
+    """
+    cache = get_cache()
+    if cache is None:
+        return loader()
+    user_key = USER_VERSION_KEY.format(user_id)
+    versions = cache.get_many([GLOBAL_VERSION_KEY, user_key])
+    for key in (GLOBAL_VERSION_KEY, user_key):
+        if key not in versions:
+            cache.add(key, _new_version(), None)
+            versions[key] = cache.get(key)
+    key = FLAGS_KEY.format(user_id, versions[user_key], versions[GLOBAL_VERSION_KEY])
+    flags = cache.get(key)
+    if flags is None:
+        flags = loader()
+        cache.set(key, flags, app_settings.ORGS_MEMBERSHIP_CACHE_TIMEOUT)
+    return flags
+
+
+def _bump(cache, key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_version(), None)
+
+
+def _bump_now_and_on_commit(cache, key):
+    _bump(cache, key)
+    on_commit = getattr(transaction, 'on_commit', None)
+    if on_commit is not None and transaction.get_connection().in_atomic_block:
+        on_commit(partial(_bump, cache, key))
+
+
+def invalidate_user(*user_ids):
+    """Discards the cached flags of the given users"""
+    cache = get_cache()
+    if cache is None:
+        return
+    for user_id in set(user_ids):
+        if user_id is not None:
+            _bump_now_and_on_commit(cache, USER_VERSION_KEY.format(user_id))
+
+
+def invalidate_all():
+    """Discards the cached flags of every user"""
+    cache = get_cache()
+    if cache is not None:
+        _bump_now_and_on_commit(cache, GLOBAL_VERSION_KEY)
+
+
+def get_dashboard_context(organization_id, activity_id, period, loader):
+    """
+    Returns the dashboard context for the organization's activity over the
+    period from the cache, calling `loader` on a miss. Contexts hold
+    translated labels, so they are cached per language.
+
+    `loader` returns the context and whether it is complete. Incomplete
+    contexts, e.g. with statistics that timed out, are not stored.
+    """
+    cache = get_dashboard_cache()
+    if cache is None:
+        return loader()[0]
+    version_key = ORGANIZATION_VERSION_KEY.format(organization_id)
+    version = cache.get(version_key)
+    if version is None:
+        cache.add(version_key, _new_version(), None)
+        version = cache.get(version_key)
+    key = DASHBOARD_KEY.format(organization_id, version, activity_id, period, translation.get_language())
+    context = cache.get(key)
+    if context is None:
+        context, complete = loader()
+        if complete:
+            cache.set(key, context, app_settings.ORGS_DASHBOARD_CACHE_TIMEOUT)
+    return context
+
+
+def invalidate_dashboards(*organization_ids):
+    """Discards the cached dashboards of the given organizations"""
+    cache = get_dashboard_cache()
+    if cache is None:
+        return
+    for organization_id in set(organization_ids):
+        if organization_id is not None:
+            _bump_now_and_on_commit(cache, ORGANIZATION_VERSION_KEY.format(organization_id))
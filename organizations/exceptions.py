@@ -13,3 +13,11 @@ class OrganizationMismatch(Exception):
     organization is assigned to be an organization's owner.
     """
     pass
+
+
+class HierarchyError(Exception):
+    """
+    Exception to raise if an organization would be moved underneath itself
+    or one of its own subgroups.
+    """
+    pass
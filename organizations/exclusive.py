@@ -0,0 +1,57 @@
+from __future__ import unicode_literals
+from builtins import object
+from django.db import transaction
+
+from .models import Organization, OrganizationUser
+
+
+class ExclusiveGroupSet(object):
+    """
+    A set of organizations of which a user may belong to at most one,
+    together with its subgroups.
+
+    Placing a user resolves the conflicting memberships in memory from the
+    user's own (few) memberships, so the cost does not depend on how many
+    groups the set contains.
+    """
+
+    def __init__(self, organizations):
+        self.organizations = organizations
+
+    @classmethod
+    def top_level(cls, site):
+        """The visible top-level groups of a site, e.g. the clubs of a brand"""
+        return cls(Organization.get_for_site(site, parents_only=True))
+
+    @classmethod
+    def siblings(cls, parent):
+        """The direct subgroups of a group"""
+        return cls(parent.get_subgroups())
+
+    def conflicting_memberships(self, user, organization):
+        """
+        Returns the user's memberships anywhere in the subtrees of the set's
+        groups or of the target organization.
+        """
+        prefixes = tuple(path for path in self.organizations.values_list('path', flat=True) if path)
+        prefixes += (organization.path,) if organization.path else ()
+        memberships = OrganizationUser.objects.filter(user=user).values_list(
+            'pk', 'organization_id', 'organization__path')
+        return [pk for pk, org_id, path in memberships
+                if org_id == organization.pk or (prefixes and path.startswith(prefixes))]
+
+    def place(self, user, organization, is_admin=False):
+        """
+        Makes the user a member of `organization` only, within this set, in
+        one transaction: conflicting memberships are deleted together and the
+        new membership is inserted.
+
+        Returns the new OrganizationUser.
+        """
+        organization.check_can_join(user)
+        with transaction.atomic():
+            conflicting = self.conflicting_memberships(user, organization)
+            if conflicting:
+                organization._delete_memberships(
+                    OrganizationUser.objects.filter(pk__in=conflicting), [user])
+            return organization.add_user(user, is_admin)
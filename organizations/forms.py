@@ -28,6 +28,7 @@ from builtins import object
 from django import forms
 from django.contrib.auth import get_user_model
 from django.contrib.sites.shortcuts import get_current_site
+from django.db import transaction
 from django.utils.translation import ugettext_lazy as _
 from markitup.widgets import MarkItUpWidget
 
@@ -93,27 +94,39 @@ class OrganizationUserAddForm(forms.ModelForm):
         model = OrganizationUser
         exclude = ('user', 'organization')
 
+    @transaction.atomic
     def save(self, *args, **kwargs):
         """
         The save method should create a new OrganizationUser linking the User
         matching the provided email address. If not matching User is found it
         should kick off the registration process. It needs to create a User in
         order to link it to the Organization.
+
+        Addresses without a user get an OrganizationInvitation instead, which
+        is returned in place of the OrganizationUser; the user and membership
+        are created when the invitation is accepted. Both have `organization`
+        and `is_admin`, but only the OrganizationUser has a `user`.
+
+        The user, membership and any emails queued in the outbox are saved in
+        one transaction.
         """
+        site = get_current_site(self.request)
+        backend = invitation_backend(site)
         try:
             user = get_user_model().objects.get(email__iexact=self.cleaned_data['email'])
         except get_user_model().MultipleObjectsReturned:
             raise forms.ValidationError(_("This email address has been used multiple times."))
         except get_user_model().DoesNotExist:
-            user = invitation_backend().invite_by_email(
-                    self.cleaned_data['email'],
-                    **{'domain': get_current_site(self.request),
-                        'organization': self.organization,
-                        'sender': self.request.user})
+            # The user is only created once they accept the invitation
+            added, invitations = backend.invite_many(
+                    [self.cleaned_data['email']], self.organization,
+                    sender=self.request.user,
+                    is_admin=self.cleaned_data['is_admin'], domain=site)
+            return invitations[0]
         # Send a notification email to this user to inform them that they
         # have been added to a new organization.
-        invitation_backend().send_notification(user, **{
-            'domain': get_current_site(self.request),
+        backend.send_notification(user, **{
+            'domain': site,
             'organization': self.organization,
             'sender': self.request.user,
         })
@@ -0,0 +1,30 @@
+from __future__ import unicode_literals
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from organizations.models import OrganizationInvitation
+
+
+class Command(BaseCommand):
+    help = "Deletes organization invitations that expired without being accepted"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, dest='batch_size',
+                            help="Number of invitations deleted per query")
+        parser.add_argument('--dry-run', action='store_true', dest='dry_run', default=False,
+                            help="Count the expired invitations without deleting them")
+
+    def handle(self, *args, **options):
+        expired = OrganizationInvitation.objects.filter(
+            status=OrganizationInvitation.PENDING, expires__lte=timezone.now())
+        if options['dry_run']:
+            self.stdout.write("{0} expired invitations".format(expired.count()))
+            return
+        deleted = 0
+        while True:
+            pks = list(expired.order_by('pk').values_list('pk', flat=True)[:options['batch_size']])
+            if not pks:
+                break
+            OrganizationInvitation.objects.filter(pk__in=pks).delete()
+            deleted += len(pks)
+        self.stdout.write("Deleted {0} expired invitations".format(deleted))
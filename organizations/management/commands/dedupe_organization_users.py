@@ -0,0 +1,49 @@
+from __future__ import unicode_literals
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from organizations.models import Organization, OrganizationOwner, OrganizationUser
+
+
+class Command(BaseCommand):
+    help = ("Merges duplicate OrganizationUser rows for the same organization and user, "
+            "which databases created without the unique constraint may contain")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', dest='dry_run', default=False,
+                            help="Report the duplicates without changing anything")
+
+    def handle(self, *args, **options):
+        duplicates = OrganizationUser.objects.order_by().values(
+            'organization_id', 'user_id').annotate(rows=Count('pk')).filter(rows__gt=1)
+        merged = 0
+        affected = set()
+        for duplicate in duplicates.iterator():
+            self.stdout.write("Organization {organization_id}, user {user_id}: {rows} rows".format(**duplicate))
+            if not options['dry_run']:
+                merged += self.merge(duplicate['organization_id'], duplicate['user_id'])
+                affected.add(duplicate['organization_id'])
+        if affected:
+            Organization.recount(Organization.objects.filter(pk__in=affected))
+        self.stdout.write("Removed {0} duplicate memberships".format(merged))
+
+    @transaction.atomic
+    def merge(self, organization_id, user_id):
+        """
+        Keeps the owner row if there is one, otherwise the oldest, folding the
+        roles and creation date of the others into it. Returns the number of
+        rows removed.
+        """
+        rows = list(OrganizationUser.objects.select_for_update().filter(
+            organization_id=organization_id, user_id=user_id).order_by('date_created', 'pk'))
+        owner = OrganizationOwner.objects.filter(organization_user__in=rows).first()
+        keep = owner.organization_user if owner else rows[0]
+        others = [row for row in rows if row.pk != keep.pk]
+        OrganizationUser.objects.filter(pk=keep.pk).update(
+            is_admin=any(row.is_admin for row in rows),
+            is_moderator=any(row.is_moderator for row in rows),
+            date_created=min(row.date_created for row in rows))
+        OrganizationOwner.objects.filter(organization_user__in=others).delete()
+        OrganizationUser.objects.filter(pk__in=[row.pk for row in others]).delete()
+        return len(others)
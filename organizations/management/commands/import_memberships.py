@@ -0,0 +1,254 @@
+from __future__ import unicode_literals
+import csv
+import io
+import itertools
+import json
+import operator
+import os
+import time
+from functools import reduce
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import six
+
+from organizations.cache import invalidate_user
+from organizations.models import Organization, OrganizationOwner, OrganizationUser, batches
+from organizations.signals import user_added
+
+# (is_admin, is_moderator) for each role
+ROLES = {
+    'member': (False, False),
+    'admin': (True, False),
+    'moderator': (False, True),
+}
+
+
+def role_name(flags):
+    is_admin, is_moderator = flags
+    return 'admin' if is_admin else 'moderator' if is_moderator else 'member'
+
+
+def read_csv(path):
+    if six.PY2:
+        with open(path, 'rb') as f:
+            for row in csv.DictReader(f):
+                yield dict((key.decode('utf-8'), (value or b'').decode('utf-8'))
+                           for key, value in row.items())
+    else:
+        with io.open(path, encoding='utf-8', newline='') as f:
+            for row in csv.DictReader(f):
+                yield row
+
+
+def read_jsonl(path):
+    with io.open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class Command(BaseCommand):
+    help = ("Imports memberships from a CSV or JSON lines file with organization (slug or "
+            "external_id), email and optional role (member, admin or moderator) columns")
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="The file to import")
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help="The file's format. Guessed from its extension by default")
+        parser.add_argument('--chunk-size', type=int, default=1000, dest='chunk_size',
+                            help="Number of rows looked up and saved per transaction")
+        parser.add_argument('--checkpoint',
+                            help="File recording how many rows have been imported, so an "
+                                 "interrupted import resumes where it stopped. Defaults to "
+                                 "the path followed by .checkpoint")
+        parser.add_argument('--dry-run', action='store_true', dest='dry_run', default=False,
+                            help="Print the memberships that would be added or changed "
+                                 "without saving anything")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.json')) else 'csv')
+        reader = read_jsonl if file_format == 'jsonl' else read_csv
+        if not os.path.exists(path):
+            raise CommandError("{0} does not exist".format(path))
+        self.dry_run = options['dry_run']
+        self.checkpoint = options['checkpoint'] or path + '.checkpoint'
+        self.organizations = {}
+        self.totals = dict.fromkeys(['added', 'updated', 'unchanged', 'errors'], 0)
+
+        done = 0 if self.dry_run else self.read_checkpoint()
+        if done:
+            self.stdout.write("Resuming after row {0}".format(done))
+        rows = itertools.islice(reader(path), done, None)
+        started = time.time()
+        processed = 0
+        while True:
+            chunk = list(itertools.islice(rows, options['chunk_size']))
+            if not chunk:
+                break
+            self.import_chunk(chunk, done + processed)
+            processed += len(chunk)
+            if not self.dry_run:
+                self.write_checkpoint(done + processed)
+            elapsed = max(time.time() - started, 0.001)
+            self.stdout.write("{0} rows processed ({1:.0f} rows/s): {added} added, {updated} updated, "
+                              "{unchanged} unchanged, {errors} errors".format(
+                                  done + processed, processed / elapsed, **self.totals))
+        if not self.dry_run and os.path.exists(self.checkpoint):
+            os.remove(self.checkpoint)
+
+    def read_checkpoint(self):
+        try:
+            with open(self.checkpoint) as f:
+                return int(f.read().strip() or 0)
+        except IOError:
+            return 0
+
+    def write_checkpoint(self, done):
+        temporary = self.checkpoint + '.tmp'
+        with open(temporary, 'w') as f:
+            f.write("{0}".format(done))
+        os.rename(temporary, self.checkpoint)
+
+    def error(self, line, message):
+        self.totals['errors'] += 1
+        self.stderr.write("! row {0}: {1}".format(line, message))
+
+    def resolve_organizations(self, keys):
+        """Looks up organizations by slug or external id, remembering them between chunks"""
+        missing = set(keys) - set(self.organizations)
+        if missing:
+            for organization in Organization.objects.filter(
+                    Q(slug__in=missing) | Q(external_id__in=missing)).only('pk', 'slug', 'external_id'):
+                self.organizations[organization.slug] = organization.pk
+                if organization.external_id:
+                    self.organizations.setdefault(organization.external_id, organization.pk)
+            self.organizations.update(dict.fromkeys(set(keys) - set(self.organizations)))
+        return self.organizations
+
+    def resolve_users(self, emails):
+        """
+        Returns the user ids by lowercased email, matching emails
+        case-insensitively. Exact matches use the email index; only the
+        emails left over are looked up with `iexact`, which can't.
+        """
+        emails = set(emails)
+        wanted = set(email.lower() for email in emails)
+        model = get_user_model()
+        users = []
+        for addresses in batches(sorted(emails | wanted)):
+            users += model.objects.filter(email__in=addresses).values_list('pk', 'email')
+        for addresses in batches(sorted(wanted - set(email.lower() for pk, email in users))):
+            query = reduce(operator.or_, (Q(email__iexact=email) for email in addresses))
+            users += model.objects.filter(query).values_list('pk', 'email')
+        # The first user registered with an address wins
+        resolved = {}
+        for pk, email in sorted(users):
+            resolved.setdefault(email.lower(), pk)
+        return resolved
+
+    def parse(self, chunk, offset):
+        """Returns the valid rows of the chunk as (line, organization, email, role)"""
+        parsed = []
+        for line, row in enumerate(chunk, start=offset + 1):
+            key = (row.get('organization') or '').strip()
+            email = (row.get('email') or '').strip()
+            role = (row.get('role') or 'member').strip().lower()
+            if not key or not email:
+                self.error(line, "organization and email are required")
+            elif role not in ROLES:
+                self.error(line, "unknown role {0!r}".format(role))
+            else:
+                parsed.append((line, key, email, role))
+        return parsed
+
+    def resolve(self, parsed):
+        """
+        Returns the wanted memberships as a dictionary of (line, role flags,
+        organization, email) by (organization id, user id).
+        """
+        organizations = self.resolve_organizations([key for line, key, email, role in parsed])
+        users = self.resolve_users([email for line, key, email, role in parsed])
+        wanted = {}
+        for line, key, email, role in parsed:
+            if organizations.get(key) is None:
+                self.error(line, "no organization {0!r}".format(key))
+            elif email.lower() not in users:
+                self.error(line, "no user with email {0!r}".format(email))
+            else:
+                # Later rows for the same membership win
+                wanted[(organizations[key], users[email.lower()])] = (line, ROLES[role], key, email)
+        return wanted
+
+    def import_chunk(self, chunk, offset):
+        """Resolves and saves one chunk of rows with a constant number of queries"""
+        wanted = self.resolve(self.parse(chunk, offset))
+        org_ids = set(org_id for org_id, user_id in wanted)
+        existing = dict(
+            ((org_id, user_id), (pk, (is_admin, is_moderator))) for org_id, user_id, pk, is_admin, is_moderator in
+            OrganizationUser.objects.filter(
+                organization_id__in=org_ids, user_id__in=set(user_id for org_id, user_id in wanted)
+            ).values_list('organization_id', 'user_id', 'pk', 'is_admin', 'is_moderator'))
+        populated = set(OrganizationUser.objects.filter(organization_id__in=org_ids).order_by().values_list(
+            'organization_id', flat=True).distinct())
+
+        new, changed = [], {}
+        for (org_id, user_id), (line, flags, key, email) in sorted(wanted.items(), key=lambda item: item[1][0]):
+            if (org_id, user_id) not in existing:
+                new.append((org_id, user_id, flags))
+                if self.dry_run:
+                    self.stdout.write("+ {0} {1} {2}".format(key, email, role_name(flags)))
+            elif existing[(org_id, user_id)][1] != flags:
+                pk, old = existing[(org_id, user_id)]
+                changed.setdefault(flags, []).append((org_id, user_id, pk, old))
+                if self.dry_run:
+                    self.stdout.write("~ {0} {1} {2} -> {3}".format(key, email, role_name(old), role_name(flags)))
+            else:
+                self.totals['unchanged'] += 1
+        self.totals['added'] += len(new)
+        self.totals['updated'] += sum(len(rows) for rows in changed.values())
+        if not self.dry_run:
+            self.save(new, changed, populated)
+
+    def save(self, new, changed, populated):
+        deltas = {}
+
+        def count(org_id, members, admins):
+            previous = deltas.get(org_id, (0, 0))
+            deltas[org_id] = (previous[0] + members, previous[1] + admins)
+
+        # Like Organization.add_user, the first member of an empty group owns it
+        owners = {}
+        for org_id, user_id, flags in new:
+            if org_id not in populated and org_id not in owners:
+                owners[org_id] = user_id
+        with transaction.atomic():
+            OrganizationUser.objects.bulk_create([
+                OrganizationUser(organization_id=org_id, user_id=user_id,
+                                 is_admin=flags[0] or owners.get(org_id) == user_id, is_moderator=flags[1])
+                for org_id, user_id, flags in new])
+            for org_id, user_id, flags in new:
+                count(org_id, 1, 1 if flags[0] or owners.get(org_id) == user_id else 0)
+            for (is_admin, is_moderator), rows in changed.items():
+                OrganizationUser.objects.filter(pk__in=[pk for org_id, user_id, pk, old in rows]).update(
+                    is_admin=is_admin, is_moderator=is_moderator)
+                for org_id, user_id, pk, old in rows:
+                    count(org_id, 0, int(is_admin) - int(old[0]))
+            if owners:
+                memberships = OrganizationUser.objects.filter(
+                    organization_id__in=owners, user_id__in=owners.values()).values_list(
+                    'organization_id', 'user_id', 'pk')
+                OrganizationOwner.objects.bulk_create([
+                    OrganizationOwner(organization_id=org_id, organization_user_id=pk)
+                    for org_id, user_id, pk in memberships if owners[org_id] == user_id])
+            Organization.adjust_counts(deltas)
+        # update() sends no signals, so the changed roles are dropped from the membership cache here
+        invalidate_user(*set(user_id for rows in changed.values() for org_id, user_id, pk, old in rows))
+        if new:
+            organizations = Organization.objects.in_bulk(set(org_id for org_id, user_id, flags in new))
+            users = get_user_model().objects.in_bulk(set(user_id for org_id, user_id, flags in new))
+            for org_id, user_id, flags in new:
+                user_added.send(sender=organizations[org_id], user=users[user_id])
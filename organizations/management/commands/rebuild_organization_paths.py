@@ -0,0 +1,12 @@
+from __future__ import unicode_literals
+from django.core.management.base import BaseCommand
+
+from organizations.models import Organization
+
+
+class Command(BaseCommand):
+    help = "Recalculates the materialized paths of organizations from their parents"
+
+    def handle(self, *args, **options):
+        changed = Organization.rebuild_paths()
+        self.stdout.write("Corrected the paths of {0} organizations".format(changed))
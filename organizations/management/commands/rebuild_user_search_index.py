@@ -0,0 +1,28 @@
+from __future__ import unicode_literals
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from organizations.search import index_users, profile_model
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the search tokens used to find users in member lists and pickers"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Number of users indexed per transaction")
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.order_by('pk')
+        if profile_model() is not None:
+            users = users.select_related('profile')
+        batch_size = options['batch_size']
+        last_pk, indexed = 0, 0
+        while True:
+            batch = list(users.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            index_users(batch)
+            indexed += len(batch)
+            last_pk = batch[-1].pk
+        self.stdout.write("Indexed {0} users".format(indexed))
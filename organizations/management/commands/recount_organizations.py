@@ -0,0 +1,19 @@
+from __future__ import unicode_literals
+from django.core.management.base import BaseCommand
+
+from organizations.models import Organization
+
+
+class Command(BaseCommand):
+    help = "Recalculates the denormalized member and admin counts of organizations"
+
+    def add_arguments(self, parser):
+        parser.add_argument('organization_ids', nargs='*', type=int,
+                            help="Only recount these organizations")
+
+    def handle(self, *args, **options):
+        organizations = Organization.objects.all()
+        if options['organization_ids']:
+            organizations = organizations.filter(pk__in=options['organization_ids'])
+        changed = Organization.recount(organizations)
+        self.stdout.write("Corrected the counts of {0} organizations".format(changed))
@@ -0,0 +1,61 @@
+from __future__ import unicode_literals
+import inject
+from dateutil.relativedelta import relativedelta
+from django.contrib.sites.models import Site
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from TinCanApp.tincandb import TinCanActivityProfile
+from organizations.activity_stats import moderated_activities, month_start, month_statistics
+from organizations.models import ActivityStatistics, Organization, RollupWatermark
+
+WATERMARK = 'rollup_org_stats'
+
+
+class Command(BaseCommand):
+    help = ("Rolls up each active group's monthly activity statistics for the closed months "
+            "since the last run, so the dashboards only compute the current month")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=12,
+                            help="Number of closed months rolled up on the first run or with --rebuild")
+        parser.add_argument('--rebuild', action='store_true', default=False,
+                            help="Ignore the watermark and roll up the last --months months again")
+
+    def handle(self, *args, **options):
+        last = month_start(timezone.now()) - relativedelta(months=1)
+        watermark = RollupWatermark.objects.filter(name=WATERMARK).first()
+        if watermark and not options['rebuild']:
+            first = watermark.month + relativedelta(months=1)
+        else:
+            first = last - relativedelta(months=options['months'] - 1)
+        months, month = [], first
+        while month <= last:
+            months.append(month)
+            month += relativedelta(months=1)
+        if not months:
+            self.stdout.write("Statistics are rolled up to {0:%b %Y}".format(last))
+            return
+
+        ap_repo = inject.instance(TinCanActivityProfile)
+        rows = 0
+        for organization in Organization.active.all():
+            site = organization.site or Site.objects.get_current()
+            for activity in moderated_activities(organization, site):
+                if not activity.active:
+                    continue
+                tcprofile = ap_repo.GetSingleActivityProfile({
+                    "profileId": "outline",
+                    "activityId": activity.url
+                })
+                if not tcprofile:
+                    continue
+                for month in months:
+                    stat = month_statistics(tcprofile, activity, organization, site, month)
+                    ActivityStatistics.objects.update_or_create(
+                        organization=organization, activity_url=activity.url, month=month,
+                        defaults=ActivityStatistics.values(stat))
+                    rows += 1
+        RollupWatermark.objects.update_or_create(name=WATERMARK, defaults={'month': last})
+        self.stdout.write("Rolled up {0} monthly statistics from {1:%b %Y} to {2:%b %Y}".format(
+            rows, months[0], last))
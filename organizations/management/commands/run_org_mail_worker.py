@@ -0,0 +1,108 @@
+from __future__ import unicode_literals
+import time
+from datetime import timedelta
+from multiprocessing.pool import ThreadPool
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from organizations.models import OutgoingEmail
+
+
+def send_batch(emails):
+    """
+    Sends the emails over one connection. Returns a list of (pk, error)
+    pairs, where error is None for emails that were sent.
+    """
+    results = []
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as error:
+        return [(email.pk, error) for email in emails]
+    try:
+        for email in emails:
+            try:
+                connection.send_messages([email.to_message(connection)])
+            except Exception as error:
+                results.append((email.pk, error))
+            else:
+                results.append((email.pk, None))
+    finally:
+        connection.close()
+    return results
+
+
+class Command(BaseCommand):
+    help = "Sends the emails queued in the organizations outbox, retrying failures with backoff"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4,
+                            help="Number of batches sent concurrently")
+        parser.add_argument('--batch-size', type=int, default=50, dest='batch_size',
+                            help="Number of emails sent over each connection")
+        parser.add_argument('--max-attempts', type=int, default=5, dest='max_attempts',
+                            help="Give up on an email after this many failures")
+        parser.add_argument('--backoff', type=int, default=60,
+                            help="Seconds before the first retry, doubled after each failure")
+        parser.add_argument('--lease', type=int, default=600,
+                            help="Seconds before emails claimed by a worker that died are retried")
+        parser.add_argument('--interval', type=float, default=5,
+                            help="Seconds to wait when the outbox is empty")
+        parser.add_argument('--once', action='store_true', default=False,
+                            help="Exit once the outbox has no more emails due")
+
+    def handle(self, *args, **options):
+        self.options = options
+        pool = ThreadPool(options['threads'])
+        try:
+            while True:
+                emails = self.claim(options['threads'] * options['batch_size'])
+                if not emails:
+                    if options['once']:
+                        break
+                    time.sleep(options['interval'])
+                    continue
+                size = options['batch_size']
+                batches = [emails[i:i + size] for i in range(0, len(emails), size)]
+                results = [result for batch in pool.map(send_batch, batches) for result in batch]
+                self.record(results)
+        finally:
+            pool.close()
+            pool.join()
+
+    def claim(self, limit):
+        """
+        Marks up to `limit` due emails as being sent by this worker and
+        returns them. Claims lapse after the lease, so emails held by a
+        worker that died are picked up again.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            pks = list(OutgoingEmail.objects.select_for_update().filter(
+                Q(status=OutgoingEmail.PENDING) | Q(status=OutgoingEmail.SENDING),
+                next_attempt__lte=now).order_by('next_attempt').values_list('pk', flat=True)[:limit])
+            OutgoingEmail.objects.filter(pk__in=pks).update(
+                status=OutgoingEmail.SENDING, next_attempt=now + timedelta(seconds=self.options['lease']))
+        return list(OutgoingEmail.objects.filter(pk__in=pks).order_by('pk'))
+
+    def record(self, results):
+        now = timezone.now()
+        sent = [pk for pk, error in results if error is None]
+        OutgoingEmail.objects.filter(pk__in=sent).update(
+            status=OutgoingEmail.SENT, sent=now, attempts=F('attempts') + 1, last_error="")
+        failed = [(pk, error) for pk, error in results if error is not None]
+        attempts = dict(OutgoingEmail.objects.filter(pk__in=[pk for pk, error in failed]).values_list('pk', 'attempts'))
+        for pk, error in failed:
+            attempt = attempts[pk] + 1
+            if attempt >= self.options['max_attempts']:
+                status, retry = OutgoingEmail.FAILED, now
+            else:
+                status, retry = OutgoingEmail.PENDING, now + timedelta(
+                    seconds=self.options['backoff'] * 2 ** (attempt - 1))
+            OutgoingEmail.objects.filter(pk=pk).update(
+                status=status, attempts=attempt, next_attempt=retry, last_error="{0}".format(error))
+        self.stdout.write("Sent {0} emails, {1} failed".format(len(sent), len(failed)))
@@ -0,0 +1,112 @@
+from __future__ import unicode_literals
+from builtins import object
+
+from .cache import get_cache, get_membership_flags
+from .models import Organization, OrganizationUser
+
+
+class MembershipResolver(object):
+    """
+    Answers membership, admin and ownership questions for one user.
+
+    All of the user's memberships, together with their organizations and
+    ownerships, are loaded with a single query the first time any question is
+    asked, so repeated checks for the same user within a request are free.
+    The answers are a snapshot; call `reset` after changing memberships.
+
+    When `ORGS_MEMBERSHIP_CACHE` is configured the membership flags used by
+    the permission checks are shared between requests through the cache.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self._memberships = None
+        self._flags = None
+
+    def reset(self):
+        self._memberships = None
+        self._flags = None
+
+    @property
+    def memberships(self):
+        """Returns a dictionary of the user's OrganizationUsers by organization id"""
+        if self._memberships is None:
+            if getattr(self.user, 'pk', None) is None:
+                self._memberships = {}
+            else:
+                self._memberships = dict(
+                    (org_user.organization_id, org_user) for org_user in
+                    OrganizationUser.objects.filter(user=self.user).select_related(
+                        'organization', 'organizationowner'))
+        return self._memberships
+
+    @property
+    def flags(self):
+        """
+        Returns a dictionary of (is_admin, is_owner, organization is_active)
+        tuples by organization id.
+        """
+        if self._flags is None:
+            if getattr(self.user, 'pk', None) is None:
+                self._flags = {}
+            elif get_cache() is None:
+                self._flags = dict(
+                    (org_id, (org_user.is_admin, hasattr(org_user, 'organizationowner'),
+                              org_user.organization.is_active))
+                    for org_id, org_user in self.memberships.items())
+            else:
+                self._flags = get_membership_flags(self.user.pk, self._load_flags)
+        return self._flags
+
+    def _load_flags(self):
+        rows = OrganizationUser.objects.filter(user=self.user).values_list(
+            'organization_id', 'is_admin', 'organizationowner', 'organization__is_active')
+        return dict((org_id, (is_admin, owner_id is not None, is_active))
+                    for org_id, is_admin, owner_id, is_active in rows)
+
+    def get(self, organization):
+        """Returns the user's OrganizationUser for the organization, or None"""
+        return self.memberships.get(getattr(organization, 'pk', organization))
+
+    def is_member(self, organization):
+        """
+        Mirrors `Organization.has_member`, which only counts active,
+        non-superuser users of active organizations.
+        """
+        flags = self.flags.get(getattr(organization, 'pk', organization))
+        return (flags is not None and flags[2] and
+                self.user.is_active and not self.user.is_superuser)
+
+    def is_admin(self, organization):
+        """Mirrors `Organization.is_admin`"""
+        if self.user.is_superuser:
+            return True
+        flags = self.flags.get(organization.pk)
+        if flags is not None and flags[0]:
+            return True
+        profile = self.user.profile
+        return bool(profile.is_supervisor and profile.site_registered_id == organization.site_id)
+
+    def is_owner(self, organization):
+        """Returns True if the user is the organization's owner"""
+        flags = self.flags.get(getattr(organization, 'pk', organization))
+        return flags is not None and flags[1]
+
+
+def get_memberships(user):
+    """
+    Returns the MembershipResolver for the user, creating it on first use.
+
+    The resolver is stored on the user instance, so it lives exactly as long
+    as the request's user object does.
+    """
+    try:
+        return user._organization_memberships
+    except AttributeError:
+        user._organization_memberships = MembershipResolver(user)
+        return user._organization_memberships
+
+
+def supports_resolver(organization):
+    """The resolver only knows about the default Organization model"""
+    return isinstance(organization, Organization)
@@ -0,0 +1,22 @@
+from __future__ import unicode_literals
+from builtins import object
+from django.utils.functional import SimpleLazyObject
+
+from .memberships import get_memberships
+
+try:
+    from django.utils.deprecation import MiddlewareMixin
+except ImportError:
+    # Django < 1.10
+    MiddlewareMixin = object
+
+
+class OrganizationMembershipMiddleware(MiddlewareMixin):
+    """
+    Attaches the request user's MembershipResolver as
+    `request.organization_memberships`. Must come after the authentication
+    middleware. Nothing is queried until the resolver is first used.
+    """
+
+    def process_request(self, request):
+        request.organization_memberships = SimpleLazyObject(lambda: get_memberships(request.user))
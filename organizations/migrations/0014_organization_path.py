@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def populate_paths(apps, schema_editor):
+    Organization = apps.get_model("organizations", "Organization")
+    parents = dict(Organization.objects.values_list("pk", "parent_id"))
+    paths = {}
+
+    def build(pk, seen):
+        if pk in paths:
+            return paths[pk]
+        parent_id = parents.get(pk)
+        if parent_id is None or parent_id in seen:
+            # Top-level group, or a cycle in existing data which is broken here
+            paths[pk] = ("{0}/".format(pk), 0)
+        else:
+            parent_path, parent_depth = build(parent_id, seen | {pk})
+            paths[pk] = ("{0}{1}/".format(parent_path, pk), parent_depth + 1)
+        return paths[pk]
+
+    for pk in parents:
+        path, depth = build(pk, {pk})
+        Organization.objects.filter(pk=pk).update(path=path, depth=depth)
+
+
+def nothing(apps, schema_editor):
+    return
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organizations', '0013_auto_20161109_1015'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='organization',
+            name='depth',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of parent groups above this group'),
+        ),
+        migrations.AddField(
+            model_name='organization',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, help_text='Primary keys of the groups from the top-level parent down to this group', max_length=255),
+        ),
+        migrations.RunPython(
+            populate_paths,
+            nothing
+        ),
+    ]
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def populate_counts(apps, schema_editor):
+    Organization = apps.get_model("organizations", "Organization")
+    OrganizationUser = apps.get_model("organizations", "OrganizationUser")
+    counts = {}
+    for org_id, is_admin in OrganizationUser.objects.values_list("organization_id", "is_admin").iterator():
+        members, admins = counts.get(org_id, (0, 0))
+        counts[org_id] = (members + 1, admins + 1 if is_admin else admins)
+    for org_id, (members, admins) in counts.items():
+        Organization.objects.filter(pk=org_id).update(member_count=members, admin_count=admins)
+
+
+def nothing(apps, schema_editor):
+    return
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organizations', '0014_organization_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='organization',
+            name='admin_count',
+            field=models.IntegerField(default=0, editable=False, help_text='Number of administrators of this group'),
+        ),
+        migrations.AddField(
+            model_name='organization',
+            name='member_count',
+            field=models.IntegerField(default=0, editable=False, help_text='Number of users in this group'),
+        ),
+        migrations.RunPython(
+            populate_counts,
+            nothing
+        ),
+    ]
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organizations', '0015_organization_counts'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='organizationuser',
+            index_together=set([('organization', 'is_admin'), ('organization', 'date_created')]),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('organizations', '0017_usersearchtoken'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MemberSelection',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=32, unique=True)),
+                ('user_ids', models.TextField(help_text='Comma separated primary keys of the selected users')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('organization', models.ForeignKey(related_name='+', to='organizations.Organization')),
+                ('user', models.ForeignKey(related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('organizations', '0019_outgoingemail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrganizationInvitation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.EmailField(max_length=254)),
+                ('is_admin', models.BooleanField(default=False)),
+                ('token', models.CharField(max_length=32, unique=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('accepted', 'Accepted'), ('revoked', 'Revoked')], default='pending', max_length=10)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('expires', models.DateTimeField()),
+                ('accepted_by', models.ForeignKey(blank=True, null=True, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('invited_by', models.ForeignKey(blank=True, null=True, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('organization', models.ForeignKey(related_name='invitations', to='organizations.Organization')),
+            ],
+            options={
+                'verbose_name': 'organization invitation',
+                'verbose_name_plural': 'organization invitations',
+            },
+        ),
+        migrations.AlterIndexTogether(
+            name='organizationinvitation',
+            index_together=set([('email', 'status'), ('status', 'expires')]),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('organizations', '0020_organizationinvitation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityStatistics',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('activity_url', models.CharField(help_text='The TinCan activity id', max_length=255)),
+                ('month', models.DateField(help_text='The first day of the month')),
+                ('num_started', models.PositiveIntegerField(default=0)),
+                ('average_statements', models.FloatField(default=0)),
+                ('average_visit_time', models.FloatField(default=0)),
+                ('test_passed_percent', models.FloatField(default=0)),
+                ('computed', models.DateTimeField(auto_now=True)),
+                ('organization', models.ForeignKey(related_name='activity_statistics', to='organizations.Organization')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('month', models.DateField()),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='activitystatistics',
+            unique_together=set([('organization', 'activity_url', 'month')]),
+        ),
+    ]
@@ -31,9 +31,33 @@ from django.http import HttpResponseForbidden
 from django.shortcuts import get_object_or_404
 from django.utils.translation import ugettext_lazy as _
 
+from .memberships import get_memberships, supports_resolver
 from .models import Organization, OrganizationUser
 
 
+# The membership resolver only reads the default Organization tables, so
+# other organization models are checked with their own methods.
+
+def is_admin(organization, user):
+    if supports_resolver(organization):
+        return get_memberships(user).is_admin(organization)
+    return organization.is_admin(user)
+
+
+def is_member(organization, user):
+    if supports_resolver(organization):
+        return get_memberships(user).is_member(organization)
+    if hasattr(organization, 'has_member'):
+        return organization.has_member(user)
+    return user.is_active and organization.organization_users.filter(user=user).exists()
+
+
+def is_owner(organization, user):
+    if supports_resolver(organization):
+        return get_memberships(user).is_owner(organization)
+    return organization.owner.organization_user.user == user
+
+
 class OrganizationMixin(object):
     """Mixin used like a SingleObjectMixin to fetch an organization"""
 
@@ -89,17 +113,16 @@ class MembershipRequiredMixin(object):
     """This mixin presumes that authentication has already been checked"""
 
     def membership_required(self):
-        ret = None
         request = self.request
-        if request.user.is_superuser or self.organization.is_admin(request.user):
+        if request.user.is_superuser or is_admin(self.organization, request.user):
             return True
 
-        if self.organization.is_hidden:
+        if getattr(self.organization, 'is_hidden', False):
             messages.warning(self.request, _("You must be a member of this group to view it"))
             # Generally, only supervisors and admins can see views relating to hidden groups
             return False
 
-        if not self.organization.has_member(request.user):
+        if not is_member(self.organization, request.user):
             messages.warning(self.request, _("You must be a member of this group to view this page"))
             return False
         else:
@@ -127,7 +150,7 @@ class AdminRequiredMixin(object):
         self.args = args
         self.kwargs = kwargs
         self.organization = self.get_organization()
-        if not self.organization.is_admin(request.user) and not \
+        if not is_admin(self.organization, request.user) and not \
                 request.user.is_superuser:
             messages.warning(self.request, _("You must be a group administrator to view this page"))
             raise PermissionDenied
@@ -143,7 +166,7 @@ class StaffRequiredMixin(object):
         self.args = args
         self.kwargs = kwargs
         self.organization = self.get_organization()
-        if not self.organization.is_admin(request.user) and not \
+        if not is_admin(self.organization, request.user) and not \
                 request.user.is_staff:
             messages.warning(self.request, _("You must be a group administrator to view this page"))
             raise PermissionDenied
@@ -159,7 +182,7 @@ class OwnerRequiredMixin(object):
         self.args = args
         self.kwargs = kwargs
         self.organization = self.get_organization()
-        if self.organization.owner.organization_user.user != request.user \
+        if not is_owner(self.organization, request.user) \
                 and not request.user.is_superuser:
             messages.warning(self.request, _("You must be the group owner to view this page"))
             raise PermissionDenied
@@ -23,18 +23,48 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import itertools
+import json
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import timedelta
+
 from .abstract import (AbstractOrganization,
                        AbstractOrganizationUser,
-                       AbstractOrganizationOwner)
+                       AbstractOrganizationOwner,
+                       USER_MODEL,
+                       user_pks)
 
+from django.contrib.auth import get_user_model
 from django.contrib.sites.models import Site
 from django.core.exceptions import PermissionDenied
+from django.core.mail import EmailMessage
 from django.core.urlresolvers import reverse
-from django.db import models
+from django.db import connection, models, transaction
+from django.db.models import Case, Count, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import Concat, Substr
+from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 from markitup.fields import MarkupField
+from .exceptions import HierarchyError
 from .fields import SlugField
-from .signals import user_added, user_removed, owner_changed
+from .signals import user_added, user_removed, users_removed, owner_changed
+
+# Count changes held back by `Organization.batched_counts`, per thread
+_pending_counts = threading.local()
+
+# Ids per `IN` clause of bulk removals, within SQLite's 999 parameter limit
+DELETE_BATCH_SIZE = 500
+
+
+def batches(items, size=None):
+    """Yields the items in lists of at most `size`, `DELETE_BATCH_SIZE` by default"""
+    size = size or DELETE_BATCH_SIZE
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
 
 
 class Organization(AbstractOrganization):
@@ -68,6 +98,14 @@ class Organization(AbstractOrganization):
                                               u"or members.")
     parent = models.ForeignKey("self", null=True, blank=True, on_delete=models.SET_NULL,
                                help_text="If this is a subgroup, select its parent here")
+    path = models.CharField(max_length=255, default="", editable=False, db_index=True,
+                            help_text="Primary keys of the groups from the top-level parent down to this group")
+    depth = models.PositiveIntegerField(default=0, editable=False,
+                                        help_text="Number of parent groups above this group")
+    member_count = models.IntegerField(default=0, editable=False,
+                                       help_text="Number of users in this group")
+    admin_count = models.IntegerField(default=0, editable=False,
+                                      help_text="Number of administrators of this group")
 
     def __unicode__(self):
         return self.name
@@ -75,23 +113,92 @@ class Organization(AbstractOrganization):
     def get_absolute_url(self):
         return reverse('organization_detail', kwargs={'organization_pk': self.pk})
 
+    def save(self, *args, **kwargs):
+        """
+        Extends the default save method by keeping the materialized `path`
+        and `depth` of this organization and its whole subtree in step with
+        `parent`.
+        """
+        parent_path, parent_depth = "", -1
+        if self.parent_id:
+            parent_path, parent_depth = Organization.objects.values_list(
+                "path", "depth").get(pk=self.parent_id)
+            if self.pk and (self.parent_id == self.pk or str(self.pk) in parent_path.split("/")):
+                raise HierarchyError(_("A group cannot be moved underneath one of its own subgroups"))
+        super(Organization, self).save(*args, **kwargs)
+        self._set_path(u"{0}{1}/".format(parent_path, self.pk), parent_depth + 1)
+
+    def delete(self, *args, **kwargs):
+        """
+        Deleting an organization detaches its subgroups, so each of them
+        becomes the root of its own tree. The paths of the whole subtree
+        below it are rewritten with a single UPDATE.
+
+        Queryset deletes don't call this method, so run the
+        `rebuild_organization_paths` command after them.
+        """
+        with transaction.atomic():
+            if self.path:
+                Organization.objects.filter(path__startswith=self.path).exclude(pk=self.pk).update(
+                    path=Substr("path", len(self.path) + 1), depth=F("depth") - (self.depth + 1))
+            return super(Organization, self).delete(*args, **kwargs)
+
+    def _set_path(self, path, depth):
+        """
+        Stores a new path and depth for this organization and rewrites the
+        paths of every descendant with a single UPDATE.
+        """
+        if path == self.path and depth == self.depth:
+            return
+        old_path, old_depth = self.path, self.depth
+        Organization.objects.filter(pk=self.pk).update(path=path, depth=depth)
+        if old_path:
+            Organization.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                path=Concat(Value(path), Substr("path", len(old_path) + 1),
+                            output_field=models.CharField()),
+                depth=F("depth") + (depth - old_depth))
+        self.path, self.depth = path, depth
+
+    def ancestors(self, include_self=False):
+        """
+        Returns the parent groups of this organization, from the top-level
+        parent down, resolved from the materialized path.
+        """
+        ids = [int(pk) for pk in self.path.split("/") if pk]
+        if not include_self:
+            ids = ids[:-1]
+        return Organization.objects.filter(pk__in=ids).order_by("depth")
+
+    def descendants(self, include_self=False):
+        """
+        Returns every subgroup below this organization, however deeply nested.
+        """
+        if not self.path:
+            return Organization.objects.none()
+        queryset = Organization.objects.filter(path__startswith=self.path)
+        if not include_self:
+            queryset = queryset.exclude(pk=self.pk)
+        return queryset
+
+    def subtree(self):
+        """
+        Returns this organization together with all of its descendants.
+        """
+        return self.descendants(include_self=True)
+
     def add_user(self, user, is_admin=False):
         """
         Adds a new user and if the first user makes the user an admin and
         the owner.
         """
-        users_count = self.users.all().count()
-        if users_count == 0:
+        is_first = not self.organization_users.exists()
+        if is_first:
             is_admin = True
         # TODO get specific org user?
-        if self.site:
-            if not user.is_superuser:
-                if self.site != user.profile.site_registered:
-                    raise PermissionDenied(u"Users not registered to {0} cannot join this group"
-                                           .format(self.site.domain))
+        self.check_can_join(user)
         org_user = OrganizationUser.objects.create(user=user,
                 organization=self, is_admin=is_admin)
-        if users_count == 0:
+        if is_first:
             # TODO get specific org user?
             OrganizationOwner.objects.create(organization=self,
                     organization_user=org_user)
@@ -100,6 +207,63 @@ class Organization(AbstractOrganization):
         user_added.send(sender=self, user=user)
         return org_user
 
+    def check_can_join(self, user):
+        """
+        Raises PermissionDenied unless the user may join this group, i.e. the
+        group is not tied to a site, the user is registered to the group's
+        site, or the user is a superuser.
+        """
+        if self.site:
+            if not user.is_superuser:
+                if self.site != user.profile.site_registered:
+                    raise PermissionDenied(u"Users not registered to {0} cannot join this group"
+                                           .format(self.site.domain))
+
+    def add_users(self, users, is_admin=False):
+        """
+        Adds many users at once using a constant number of queries. `users`
+        may be user instances or primary keys.
+
+        Returns a dictionary mapping each user primary key to "added",
+        "existing", "ineligible" (not registered to the group's site) or
+        "missing". If the group has no users the first new user is made an
+        admin and the owner, as with `add_user`.
+        """
+        pks = user_pks(users)
+        candidates = get_user_model().objects.filter(pk__in=pks)
+        if self.site:
+            candidates = candidates.filter(Q(is_superuser=True) | Q(profile__site_registered=self.site))
+        eligible = candidates.in_bulk(pks)
+        outcomes = dict((pk, 'added' if pk in eligible else 'missing') for pk in pks)
+        if self.site and len(eligible) < len(pks):
+            registered = get_user_model().objects.filter(pk__in=pks).values_list('pk', flat=True)
+            for pk in set(registered) - set(eligible):
+                outcomes[pk] = 'ineligible'
+
+        with transaction.atomic():
+            existing = set(OrganizationUser.objects.filter(
+                organization=self, user_id__in=list(eligible)).values_list('user_id', flat=True))
+            new_users = [eligible[pk] for pk in pks if pk in eligible and pk not in existing]
+            if new_users and not OrganizationUser.objects.filter(organization=self).exists():
+                org_user = OrganizationUser.objects.create(user=new_users[0],
+                        organization=self, is_admin=True)
+                OrganizationOwner.objects.create(organization=self,
+                        organization_user=org_user)
+                new_users = new_users[1:]
+            OrganizationUser.objects.bulk_create([
+                OrganizationUser(user=user, organization=self, is_admin=is_admin)
+                for user in new_users])
+            Organization.adjust_counts({
+                self.pk: (len(new_users), len(new_users) if is_admin else 0)})
+        for pk in existing:
+            outcomes[pk] = 'existing'
+
+        for pk in pks:
+            if outcomes[pk] == 'added':
+                # User added signal
+                user_added.send(sender=self, user=eligible[pk])
+        return outcomes
+
     def has_member(self, user):
         try:
             ou = OrganizationUser.active.get(
@@ -125,14 +289,103 @@ class Organization(AbstractOrganization):
 
         return Organization.objects.filter(**queryset).exclude(**queryset_exclude)
 
-    def get_parents(self, include_self=False):
-        parents = [self, ] if include_self else []
-        parent = self.parent
-        while parent:
-            parents += [self.parent]
-            parent = self.parent
+    @staticmethod
+    def adjust_counts(deltas):
+        """
+        Atomically applies changes to the denormalized member and admin
+        counts in one UPDATE. `deltas` maps organization ids to a tuple of
+        (member change, admin change).
+        """
+        deltas = dict((pk, delta) for pk, delta in deltas.items() if any(delta))
+        pending = getattr(_pending_counts, 'deltas', None)
+        if pending is not None:
+            for pk, (members, admins) in deltas.items():
+                previous = pending.get(pk, (0, 0))
+                pending[pk] = (previous[0] + members, previous[1] + admins)
+            return
+        if not deltas:
+            return
+
+        def change(index):
+            return Case(*[When(pk=pk, then=Value(delta[index])) for pk, delta in deltas.items()],
+                        default=Value(0), output_field=IntegerField())
+        Organization.objects.filter(pk__in=list(deltas)).update(
+            member_count=F('member_count') + change(0),
+            admin_count=F('admin_count') + change(1))
+
+    @staticmethod
+    def rebuild_paths():
+        """
+        Recalculates every organization's `path` and `depth` from `parent`,
+        repairing them after writes that bypass `save` and `delete`, such as
+        queryset deletes. Returns the number of organizations changed.
+        """
+        rows = dict((pk, (parent_id, path, depth)) for pk, parent_id, path, depth in
+                    Organization.objects.values_list("pk", "parent_id", "path", "depth"))
+        paths = {}
+
+        def build(pk, seen):
+            if pk not in paths:
+                parent_id = rows[pk][0]
+                if parent_id is None or parent_id in seen or parent_id not in rows:
+                    # Top-level group, or a cycle which is broken here
+                    paths[pk] = (u"{0}/".format(pk), 0)
+                else:
+                    parent_path, parent_depth = build(parent_id, seen | {pk})
+                    paths[pk] = (u"{0}{1}/".format(parent_path, pk), parent_depth + 1)
+            return paths[pk]
+
+        changed = 0
+        for pk, (parent_id, path, depth) in rows.items():
+            if build(pk, {pk}) != (path, depth):
+                new_path, new_depth = paths[pk]
+                Organization.objects.filter(pk=pk).update(path=new_path, depth=new_depth)
+                changed += 1
+        return changed
+
+    @staticmethod
+    @contextmanager
+    def batched_counts():
+        """
+        Collects the count changes made inside the block, e.g. by a bulk
+        delete sending `post_delete` for every membership, and applies them
+        with one UPDATE when it exits. Nested blocks join the outer one.
+        """
+        if getattr(_pending_counts, 'deltas', None) is not None:
+            yield
+            return
+        _pending_counts.deltas = {}
+        try:
+            yield
+            deltas = _pending_counts.deltas
+        finally:
+            _pending_counts.deltas = None
+        Organization.adjust_counts(deltas)
 
-        return parents
+    @staticmethod
+    def recount(organizations=None):
+        """
+        Recalculates `member_count` and `admin_count` from the membership
+        table, repairing any drift. Returns the number of organizations whose
+        counts were changed.
+        """
+        if organizations is None:
+            organizations = Organization.objects.all()
+        counts = organizations.order_by().annotate(
+            members=Count('organization_users'),
+            admins=Sum(Case(When(organization_users__is_admin=True, then=Value(1)),
+                            default=Value(0), output_field=IntegerField())))
+        changed = 0
+        for pk, members, admins, member_count, admin_count in counts.values_list(
+                'pk', 'members', 'admins', 'member_count', 'admin_count').iterator():
+            admins = admins or 0
+            if (members, admins) != (member_count, admin_count):
+                Organization.objects.filter(pk=pk).update(member_count=members, admin_count=admins)
+                changed += 1
+        return changed
+
+    def get_parents(self, include_self=False):
+        return list(self.ancestors(include_self=include_self).order_by("-depth"))
 
     def get_subgroups(self):
         subgroups = Organization.objects.filter(
@@ -156,7 +409,7 @@ class Organization(AbstractOrganization):
             query["user__profile__site_registered"] = self.site
 
         if include_parents:
-            query["organization__in"] = self.get_parents(include_self=True),
+            query["organization__in"] = self.ancestors(include_self=True)
         else:
             query["organization"] = self
 
@@ -165,59 +418,174 @@ class Organization(AbstractOrganization):
 
         return OrganizationUser.objects.filter(**query).select_related()
 
+    def member_id_chunks(self, size=None, **kwargs):
+        """
+        Yields the user ids of the members returned by `get_members`, as
+        strings, in lists of at most `size` ids. The ids are streamed from
+        the database rather than loaded at once, so each chunk can be sent
+        to Mongo as a bounded `$in` filter.
+        """
+        from . import app_settings
+        size = size or app_settings.ORGS_MEMBER_ID_CHUNK_SIZE
+        ids = self.get_members(**kwargs).order_by('user_id').values_list(
+            'user_id', flat=True).distinct().iterator()
+        while True:
+            chunk = ["{0}".format(pk) for pk in itertools.islice(ids, size)]
+            if not chunk:
+                return
+            yield chunk
+
+    def non_member_candidates(self, site=None, is_active=True):
+        """
+        Returns the users who are not members of this group, optionally only
+        those registered on `site`. Pass `is_active=None` to include users
+        regardless of their active flag.
+
+        Members are excluded with a correlated NOT EXISTS subquery rather
+        than a list of member ids, so this is a single query however large
+        the group is.
+        """
+        user_model = get_user_model()
+        users = user_model.objects.all()
+        if is_active is not None:
+            users = users.filter(is_active=is_active)
+        if site is not None:
+            users = users.filter(profile__site_registered=site)
+        qn = connection.ops.quote_name
+        not_member = ("NOT EXISTS (SELECT 1 FROM {table} "
+                      "WHERE {table}.{user} = {users}.{pk} AND {table}.{org} = %s)").format(
+            table=qn(OrganizationUser._meta.db_table),
+            user=qn(OrganizationUser._meta.get_field('user').column),
+            org=qn(OrganizationUser._meta.get_field('organization').column),
+            users=qn(user_model._meta.db_table),
+            pk=qn(user_model._meta.pk.column))
+        return users.extra(where=[not_member], params=[self.pk])
+
     def remove_user(self, user):
-        try:
-            ou = OrganizationUser.objects.filter(
-                user=user,
-                organization=self
-            )
-            ou.delete()
-            # User removed signal
-            user_removed.send(sender=self, user=user)
+        """
+        Removes the user from this group and from every group below it.
 
-        except OrganizationUser.DoesNotExist:
-            pass
+        Returns the ids of the organizations the user was removed from.
+        """
+        removed, kept = self._remove_from_subtree([user])
+        return sorted(set(org_id for org_id, user_id in removed))
 
-        for o in self.get_subgroups():
-            try:
-                ou = OrganizationUser.objects.filter(
-                    user=user,
-                    organization=o
-                )
-                ou.delete()
-                user_removed.send(sender=self, user=user)
-            except OrganizationUser.DoesNotExist:
-                pass
+    def remove_users(self, users, include_subgroups=True, batch_signal=False):
+        """
+        Deletes many users from this group and all of its subgroups, or only
+        from this group without `include_subgroups`, in batches of queryset
+        deletes. Group owners are never removed. With `batch_signal` one
+        `users_removed` signal is sent per organization instead of a
+        `user_removed` signal per membership.
+
+        Returns a dictionary mapping each user primary key to "removed",
+        "owner" (only held owner memberships) or "not_member".
+        """
+        users = list(users)
+        if include_subgroups:
+            removed, kept = self._remove_from_subtree(users, keep_owners=True, batch_signal=batch_signal)
+        else:
+            removed, kept = self._delete_memberships(
+                OrganizationUser.objects.filter(organization=self), users, keep_owners=True,
+                batch_signal=batch_signal)
+        outcomes = dict((pk, 'not_member') for pk in user_pks(users))
+        for org_id, user_id in kept:
+            outcomes[user_id] = 'owner'
+        for org_id, user_id in removed:
+            outcomes[user_id] = 'removed'
+        return outcomes
+
+    def _remove_from_subtree(self, users, keep_owners=False, batch_signal=False):
+        """
+        Deletes the memberships of the given users across this organization's
+        whole subtree in batches of queryset deletes and sends `user_removed` for each
+        membership deleted, with the affected organization as the sender.
 
-    def add_user_to_unique_parent_group(self, user, site, is_admin=False):
-        if self.site:
-            if not user.is_superuser:
-                if self.site != user.profile.site_registered:
-                    raise PermissionDenied(u"Users not registered to {0} cannot join this group"
-                                           .format(self.site.domain))
+        Returns the deleted and, with `keep_owners`, the retained owner
+        memberships as lists of (organization id, user id) pairs.
+        """
+        if self.path:
+            memberships = OrganizationUser.objects.filter(organization__path__startswith=self.path)
+        else:
+            memberships = OrganizationUser.objects.filter(organization=self)
+        return self._delete_memberships(memberships, users, keep_owners=keep_owners, batch_signal=batch_signal)
 
-        if self.parent:
-            raise PermissionDenied(u"Cannot add user to parent with parents")
+    def _delete_memberships(self, memberships, users=(), keep_owners=False, batch_signal=False):
+        """
+        Deletes the users' memberships from the given OrganizationUser
+        queryset and sends `user_removed` for each deleted membership, or with
+        `batch_signal` `users_removed` for each affected organization. Any of
+        `users` given as instances are used as the signals' users.
+
+        The memberships are looked up and deleted with `QuerySet.delete()` in
+        batches of `DELETE_BATCH_SIZE` ids, so cascades and `post_delete`
+        receivers run as usual; their count changes are applied at once.
 
-        for o in self.get_for_site(site, parents_only=True):
-            o.remove_user(user)
+        Returns the deleted and retained memberships as described in
+        `_remove_from_subtree`.
+        """
+        rows = []
+        for pks in batches(user_pks(users)):
+            rows += memberships.filter(user_id__in=pks).values_list(
+                'pk', 'organization_id', 'user_id', 'is_admin', 'organizationowner')
+        if keep_owners:
+            rows, kept = ([row for row in rows if row[4] is None],
+                          [(org_id, user_id) for pk, org_id, user_id, is_admin, owner_id in rows
+                           if owner_id is not None])
+        else:
+            kept = []
+        removed = [(org_id, user_id) for pk, org_id, user_id, is_admin, owner_id in rows]
+        if not removed:
+            return removed, kept
+        with transaction.atomic(), Organization.batched_counts():
+            for pks in batches(row[0] for row in rows):
+                OrganizationUser.objects.filter(pk__in=pks).delete()
+        self._send_removed(removed, users, batch_signal)
+        return removed, kept
+
+    def _send_removed(self, removed, users, batch_signal):
+        """
+        Sends the removal signals for the deleted (organization id, user id)
+        pairs, loading the users and organizations not already at hand.
+        """
+        instances = dict((user.pk, user) for user in users if hasattr(user, 'pk'))
+        missing = set(user_id for org_id, user_id in removed) - set(instances)
+        if missing:
+            instances.update(get_user_model().objects.in_bulk(list(missing)))
+        organizations = {self.pk: self}
+        others = set(org_id for org_id, user_id in removed) - set(organizations)
+        if others:
+            organizations.update(Organization.objects.in_bulk(list(others)))
+        if batch_signal:
+            by_organization = {}
+            for org_id, user_id in removed:
+                by_organization.setdefault(org_id, []).append(instances[user_id])
+            for org_id, removed_users in sorted(by_organization.items()):
+                users_removed.send(sender=organizations[org_id], users=removed_users)
+        else:
+            for org_id, user_id in removed:
+                # User removed signal
+                user_removed.send(sender=organizations[org_id], user=instances[user_id])
 
-        self.add_user(user, is_admin)
+    def add_user_to_unique_parent_group(self, user, site, is_admin=False):
+        """
+        Places the user in this top-level group, removing them from every
+        other top-level group of the site and all of their subgroups.
+        """
+        from .exclusive import ExclusiveGroupSet
+        if self.parent:
+            raise PermissionDenied(u"Cannot add user to parent with parents")
+        return ExclusiveGroupSet.top_level(site).place(user, self, is_admin=is_admin)
 
     def add_user_to_unique_subgroup(self, user, is_admin=False):
-        if self.site:
-            if not user.is_superuser:
-                if self.site != user.profile.site_registered:
-                    raise PermissionDenied(u"Users not registered to {0} cannot join this group"
-                                           .format(self.site.domain))
-
+        """
+        Places the user in this subgroup, removing them from its sibling
+        subgroups and everything below them.
+        """
+        from .exclusive import ExclusiveGroupSet
         if not self.parent:
             raise PermissionDenied(u"Cannot add user to subgroup with no parent")
-
-        for o in self.parent.get_subgroups():
-            o.remove_user(user)
-
-        self.add_user(user, is_admin)
+        return ExclusiveGroupSet.siblings(self.parent).place(user, self, is_admin=is_admin)
 
     def get_or_add_user(self, user, **kwargs):
         """
@@ -232,14 +600,14 @@ class Organization(AbstractOrganization):
         OrganizationUser was created or not.
         """
         is_admin = kwargs.pop('is_admin', False)
-        users_count = self.users.all().count()
-        if users_count == 0:
+        is_first = not self.organization_users.exists()
+        if is_first:
             is_admin = True
 
         org_user, created = OrganizationUser.objects.get_or_create(
                 organization=self, user=user, defaults={'is_admin': is_admin})
 
-        if users_count == 0:
+        if is_first:
             OrganizationOwner.objects.create(organization=self,
                     organization_user=org_user)
 
@@ -294,11 +662,30 @@ class OrganizationUser(AbstractOrganizationUser):
         abstract = False
         verbose_name = _("organization user")
         verbose_name_plural = _("organization users")
+        index_together = [
+            ('organization', 'is_admin'),
+            ('organization', 'date_created'),
+        ]
 
     def __unicode__(self):
         return u"{0} ({1})".format(self.name if self.user.is_active else
                 self.user.email, self.organization.name)
 
+    def save(self, *args, **kwargs):
+        """
+        Extends the default save method by keeping the organization's member
+        and admin counts up to date.
+        """
+        if self._state.adding:
+            delta = (1, 1 if self.is_admin else 0)
+        else:
+            was_admin = OrganizationUser.objects.filter(pk=self.pk).values_list(
+                'is_admin', flat=True).first()
+            delta = (0, int(bool(self.is_admin)) - int(bool(was_admin)))
+        with transaction.atomic():
+            super(OrganizationUser, self).save(*args, **kwargs)
+            Organization.adjust_counts({self.organization_id: delta})
+
     def delete(self, using=None, keep_parents=False):
         """
         If the organization user is also the owner, this should not be deleted
@@ -314,6 +701,7 @@ class OrganizationUser(AbstractOrganizationUser):
         # TODO This line presumes that OrgOwner model can't be modified
         except OrganizationOwner.DoesNotExist:
             pass
+        # The counts are adjusted by the post_delete receiver, which also sees cascades
         super(AbstractOrganizationUser, self).delete(using=using, keep_parents=keep_parents)
 
     def get_absolute_url(self):
@@ -346,3 +734,205 @@ class OrganizationOwner(AbstractOrganizationOwner):
             raise OrganizationMismatch
         else:
             super(AbstractOrganizationOwner, self).save(*args, **kwargs)
+
+
+class UserSearchToken(models.Model):
+    """
+    A normalized word, or the prefix of a word, from a user's name or email
+    address, keyed by the site the user registered on. Maintained by
+    `organizations.search.index_users`.
+    """
+    user = models.ForeignKey(USER_MODEL, related_name="organization_search_tokens")
+    site = models.ForeignKey(Site, null=True, blank=True, related_name="+")
+    token = models.CharField(max_length=30)
+
+    class Meta:
+        index_together = [
+            ('token', 'site'),
+        ]
+
+
+class MemberSelection(models.Model):
+    """
+    Members picked in a group's member list for a bulk action, kept on the
+    server and referred to by `token` until the action is confirmed.
+    """
+    token = models.CharField(max_length=32, unique=True)
+    organization = models.ForeignKey(Organization, related_name="+")
+    user = models.ForeignKey(USER_MODEL, related_name="+")
+    user_ids = models.TextField(help_text=u"Comma separated primary keys of the selected users")
+    created = models.DateTimeField(auto_now_add=True)
+
+    # Unconfirmed selections are discarded after this long
+    lifetime = timedelta(days=1)
+
+    @classmethod
+    def create(cls, organization, user, user_ids):
+        """Stores a new selection, discarding expired ones, and returns it"""
+        cls.objects.filter(created__lt=timezone.now() - cls.lifetime).delete()
+        return cls.objects.create(
+            token=uuid.uuid4().hex, organization=organization, user=user,
+            user_ids=",".join("{0}".format(pk) for pk in user_pks(user_ids)))
+
+    def get_user_ids(self):
+        return [int(pk) for pk in self.user_ids.split(",") if pk]
+
+
+class OutgoingEmail(models.Model):
+    """
+    An email waiting in the outbox. Backends write these instead of sending
+    when `ORGS_EMAIL_OUTBOX` is enabled, in the same transaction as the
+    change that caused them, and the `run_org_mail_worker` command sends them.
+    """
+    PENDING = 'pending'
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, _("Pending")),
+        (SENDING, _("Sending")),
+        (SENT, _("Sent")),
+        (FAILED, _("Failed")),
+    )
+
+    subject = models.TextField()
+    body = models.TextField()
+    from_email = models.CharField(max_length=255)
+    to = models.TextField(help_text=u"Comma separated recipient addresses")
+    headers = models.TextField(default="{}", help_text=u"JSON encoded extra headers")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt = models.DateTimeField(default=timezone.now,
+                                        help_text=u"When a pending email is next tried, or when a worker's "
+                                                  u"claim on an email being sent lapses")
+    last_error = models.TextField(blank=True, default="")
+    created = models.DateTimeField(auto_now_add=True)
+    sent = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        index_together = [
+            ('status', 'next_attempt'),
+        ]
+
+    @classmethod
+    def from_message(cls, message):
+        """Returns an unsaved outbox entry for an EmailMessage"""
+        return cls(subject=message.subject, body=message.body, from_email=message.from_email,
+                   to=",".join(message.to), headers=json.dumps(message.extra_headers))
+
+    def to_message(self, connection=None):
+        return EmailMessage(self.subject, self.body, self.from_email, self.to.split(","),
+                            headers=json.loads(self.headers), connection=connection)
+
+
+class OrganizationInvitation(models.Model):
+    """
+    An invitation for an email address to join an organization. The user
+    account is only created when the invitation is accepted.
+    """
+    PENDING = 'pending'
+    ACCEPTED = 'accepted'
+    REVOKED = 'revoked'
+    STATUS_CHOICES = (
+        (PENDING, _("Pending")),
+        (ACCEPTED, _("Accepted")),
+        (REVOKED, _("Revoked")),
+    )
+
+    email = models.EmailField(max_length=254)
+    organization = models.ForeignKey(Organization, related_name="invitations")
+    invited_by = models.ForeignKey(USER_MODEL, null=True, blank=True, related_name="+")
+    is_admin = models.BooleanField(default=False)
+    token = models.CharField(max_length=32, unique=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    created = models.DateTimeField(auto_now_add=True)
+    expires = models.DateTimeField()
+    accepted_by = models.ForeignKey(USER_MODEL, null=True, blank=True, related_name="+")
+
+    class Meta:
+        verbose_name = _("organization invitation")
+        verbose_name_plural = _("organization invitations")
+        index_together = [
+            ('email', 'status'),
+            ('status', 'expires'),
+        ]
+
+    def __unicode__(self):
+        return u"{0} ({1})".format(self.email, self.organization.name)
+
+    @classmethod
+    def pending(cls):
+        """Returns the invitations that can still be accepted"""
+        return cls.objects.filter(status=cls.PENDING, expires__gt=timezone.now())
+
+    @classmethod
+    def create_many(cls, organization, emails, invited_by=None, is_admin=False):
+        """
+        Returns a pending invitation to the organization for each distinct
+        email address, reusing any that are still pending. New invitations
+        are created with a single insert.
+        """
+        from . import app_settings
+        emails = list(OrderedDict((email.strip().lower(), None) for email in emails if email.strip()))
+        invitations = dict((invitation.email, invitation) for invitation in cls.pending().filter(
+            organization=organization, email__in=emails))
+        missing = [email for email in emails if email not in invitations]
+        if missing:
+            expires = timezone.now() + timedelta(days=app_settings.ORGS_INVITATION_TIMEOUT_DAYS)
+            new = [cls(email=email, organization=organization, invited_by=invited_by, is_admin=is_admin,
+                       token=uuid.uuid4().hex, expires=expires) for email in missing]
+            cls.objects.bulk_create(new)
+            # Older databases don't return primary keys from bulk inserts
+            invitations.update((invitation.email, invitation) for invitation in cls.objects.filter(
+                token__in=[invitation.token for invitation in new]))
+        return [invitations[email] for email in emails]
+
+    def accept(self, user):
+        """Adds the user to the organization and marks the invitation accepted"""
+        with transaction.atomic():
+            if not self.organization.organization_users.filter(user=user).exists():
+                self.organization.add_user(user, is_admin=self.is_admin)
+            self.status = self.ACCEPTED
+            self.accepted_by = user
+            self.save()
+
+
+class ActivityStatistics(models.Model):
+    """
+    A group's statistics for an activity over one closed month, rolled up by
+    the `rollup_org_stats` command so the dashboards only compute the
+    current month from the TinCan data.
+    """
+    organization = models.ForeignKey(Organization, related_name="activity_statistics")
+    activity_url = models.CharField(max_length=255, help_text=u"The TinCan activity id")
+    month = models.DateField(help_text=u"The first day of the month")
+    num_started = models.PositiveIntegerField(default=0)
+    average_statements = models.FloatField(default=0)
+    average_visit_time = models.FloatField(default=0)
+    test_passed_percent = models.FloatField(default=0)
+    computed = models.DateTimeField(auto_now=True)
+
+    # The statistics copied from `GetStatistics` results
+    statistics = ('num_started', 'average_statements', 'average_visit_time', 'test_passed_percent')
+
+    class Meta:
+        unique_together = [
+            ('organization', 'activity_url', 'month'),
+        ]
+
+    @classmethod
+    def values(cls, stat):
+        """Returns the rolled up fields of a `GetStatistics` result"""
+        return dict((name, getattr(stat, name, 0) or 0) for name in cls.statistics)
+
+    def apply_to(self, activity):
+        """Sets the statistics on the activity, as `GetStatistics` does, and returns it"""
+        for name in self.statistics:
+            setattr(activity, name, getattr(self, name))
+        return activity
+
+
+class RollupWatermark(models.Model):
+    """The last month a rollup command processed, so its next run resumes after it"""
+    name = models.CharField(max_length=50, unique=True)
+    month = models.DateField()
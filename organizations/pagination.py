@@ -0,0 +1,184 @@
+"""
+Keyset ("cursor") pagination.
+
+Pages are selected with a WHERE clause on the sort key and primary key of
+the last row seen rather than an OFFSET, so fetching page 1,000 costs the
+same as fetching page 1, and no COUNT(*) is needed to render a page.
+"""
+from __future__ import unicode_literals
+import base64
+import json
+from builtins import object
+from datetime import date, datetime, time
+from decimal import Decimal, InvalidOperation
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.utils.dateparse import parse_date, parse_datetime, parse_time
+
+
+# Sort values JSON can't hold exactly are stored as text with a type tag
+PARSERS = {
+    'datetime': parse_datetime,
+    'date': parse_date,
+    'time': parse_time,
+    'decimal': Decimal,
+}
+
+
+def dump_value(value):
+    """Returns the (type tag, JSON value) of a sort value, keeping times to the microsecond"""
+    for tag, value_type in (('datetime', datetime), ('date', date), ('time', time), ('decimal', Decimal)):
+        if isinstance(value, value_type):
+            return tag, value.isoformat() if tag != 'decimal' else str(value)
+    return None, value
+
+
+def load_value(tag, value):
+    """Returns the sort value dumped by `dump_value`"""
+    if tag is None or value is None:
+        return value
+    parsed = PARSERS[tag](value)
+    if parsed is None:
+        raise ValueError("Invalid {0} {1!r}".format(tag, value))
+    return parsed
+
+
+def encode_cursor(value, pk, backwards=False):
+    """Returns an opaque, URL-safe cursor for the sort key of a row"""
+    tag, value = dump_value(value)
+    data = json.dumps([tag, value, pk, backwards], cls=DjangoJSONEncoder)
+    return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Returns the (value, pk, backwards) encoded in a cursor, or None if it is invalid"""
+    try:
+        tag, value, pk, backwards = json.loads(base64.urlsafe_b64decode(str(cursor)).decode('utf-8'))
+        value = load_value(tag, value)
+    except (TypeError, ValueError, KeyError, InvalidOperation):
+        return None
+    return value, pk, bool(backwards)
+
+
+class CursorPage(object):
+    """A page of results with cursors to the neighbouring pages"""
+
+    def __init__(self, object_list, next_cursor, previous_cursor, total=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self._total = total
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def total(self):
+        """
+        The total supplied to the paginator, which may be approximate, or
+        None if no total was requested.
+        """
+        if callable(self._total):
+            self._total = self._total()
+        return self._total
+
+
+class CursorPaginator(object):
+    """
+    Paginates a queryset by `sort_field` (optionally prefixed with '-' for
+    descending order, and possibly spanning relations, e.g.
+    'user__first_name') with the primary key as a tie-breaker. Rows whose
+    sort field is NULL come after the others in ascending order and before
+    them in descending order.
+
+    `total` is passed through to the pages. It may be a number, such as a
+    denormalized count, or a callable like `queryset.count` that is only
+    evaluated if the page's total is used.
+    """
+
+    def __init__(self, queryset, sort_field='pk', per_page=40, total=None):
+        self.queryset = queryset
+        self.descending = sort_field.startswith('-')
+        self.sort_field = sort_field.lstrip('-')
+        self.per_page = per_page
+        self.total = total
+        self.nullable = self.is_nullable(queryset.model, self.sort_field)
+
+    @staticmethod
+    def is_nullable(model, sort_field):
+        """Returns whether the field, or a relation on the way to it, may be NULL"""
+        if sort_field == 'pk':
+            return False
+        for name in sort_field.split('__'):
+            field = model._meta.get_field(name)
+            if field.null:
+                return True
+            model = field.related_model
+        return False
+
+    def sort_key(self, obj):
+        value = obj
+        for attr in self.sort_field.split('__'):
+            value = getattr(value, attr)
+            if value is None:
+                break
+        return value, obj.pk
+
+    def after(self, value, pk, lookup):
+        """Filters the rows after the (value, pk) position in the order of the lookup"""
+        field = self.sort_field
+        if value is None:
+            # NULLs sort after the values going 'gt' and before them going 'lt'
+            after = Q(**{'{0}__isnull'.format(field): True, 'pk__{0}'.format(lookup): pk})
+            if lookup == 'lt':
+                after |= Q(**{'{0}__isnull'.format(field): False})
+            return after
+        after = (Q(**{'{0}__{1}'.format(field, lookup): value}) |
+                 Q(**{field: value, 'pk__{0}'.format(lookup): pk}))
+        if lookup == 'gt' and self.nullable:
+            after |= Q(**{'{0}__isnull'.format(field): True})
+        return after
+
+    def page(self, cursor=None):
+        position = decode_cursor(cursor) if cursor else None
+        backwards = position is not None and position[2]
+        ascending = self.descending == backwards
+        lookup = 'gt' if ascending else 'lt'
+        direction = '' if ascending else '-'
+
+        queryset = self.queryset
+        if position is not None:
+            queryset = queryset.filter(self.after(position[0], position[1], lookup))
+        order = [direction + self.sort_field, direction + 'pk']
+        if self.nullable:
+            # Databases disagree on where NULLs sort, so they are ordered explicitly
+            queryset = queryset.annotate(cursor_sort_null=Case(
+                When(**{'{0}__isnull'.format(self.sort_field): True, 'then': Value(1)}),
+                default=Value(0), output_field=IntegerField()))
+            order.insert(0, direction + 'cursor_sort_null')
+        queryset = queryset.order_by(*order)
+
+        rows = list(queryset[:self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+        has_next = more if not backwards else position is not None
+        has_previous = more if backwards else position is not None
+
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = encode_cursor(*self.sort_key(rows[-1]))
+        if rows and has_previous:
+            previous_cursor = encode_cursor(*self.sort_key(rows[0]), backwards=True)
+        return CursorPage(rows, next_cursor, previous_cursor, total=self.total)
@@ -0,0 +1,70 @@
+from __future__ import unicode_literals
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalidate_all, invalidate_dashboards, invalidate_user
+from .models import Organization, OrganizationUser, UserSearchToken
+from .search import SEARCH_FIELDS, index_users, profile_model
+from .signals import owner_changed, user_added, user_removed, users_removed
+
+
+@receiver(user_added)
+@receiver(user_removed)
+def membership_changed(sender, user, **kwargs):
+    invalidate_user(user.pk)
+    invalidate_dashboards(sender.pk)
+
+
+@receiver(users_removed)
+def memberships_removed(sender, users, **kwargs):
+    invalidate_user(*[user.pk for user in users])
+    invalidate_dashboards(sender.pk)
+
+
+@receiver(owner_changed)
+def ownership_changed(sender, old, new, **kwargs):
+    invalidate_user(old.user_id, new.user_id)
+
+
+@receiver(post_save, sender=OrganizationUser)
+@receiver(post_delete, sender=OrganizationUser)
+def organization_user_changed(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
+
+
+@receiver(post_delete, sender=OrganizationUser)
+def organization_user_deleted(sender, instance, **kwargs):
+    """Keeps the member counts right for every delete, including cascades from deleted users"""
+    Organization.adjust_counts({instance.organization_id: (-1, -1 if instance.is_admin else 0)})
+
+
+@receiver(post_save, sender=Organization)
+@receiver(post_delete, sender=Organization)
+def organization_changed(sender, instance, **kwargs):
+    invalidate_all()
+
+
+@receiver(post_save, sender=get_user_model())
+def user_saved(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Saves that don't touch the searched fields, like `last_login` updates, keep the tokens"""
+    if raw or (update_fields is not None and not set(update_fields) & set(SEARCH_FIELDS)):
+        return
+    index_users([instance])
+
+
+def profile_saved(sender, instance, raw=False, **kwargs):
+    """The site users are searched by is stored on their profile"""
+    if not raw:
+        index_users([instance.user])
+
+
+if profile_model() is not None:
+    post_save.connect(profile_saved, sender=profile_model())
+
+
+@receiver(post_save, sender=OrganizationUser)
+def organization_user_created(sender, instance, created, raw=False, **kwargs):
+    """Indexes users saved before the search index existed when they join a group"""
+    if created and not raw and not UserSearchToken.objects.filter(user_id=instance.user_id).exists():
+        index_users([instance.user])
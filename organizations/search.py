@@ -0,0 +1,80 @@
+"""
+Indexed user search.
+
+Instead of scanning the user table with `icontains`, searches look up exact
+tokens in `UserSearchToken`: every word of a user's first name, last name
+and email address is stored together with all of its prefixes, so a search
+for "gro" finds "Grohl" with an index lookup. Each word searched for must
+start a word of the user's name or email address.
+"""
+from __future__ import unicode_literals
+import re
+import unicodedata
+from builtins import range
+from collections import OrderedDict
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import FieldDoesNotExist
+from django.db import transaction
+from django.utils.encoding import force_text
+
+from .models import UserSearchToken
+
+TOKEN_LENGTH = UserSearchToken._meta.get_field('token').max_length
+# The user fields whose words are indexed
+SEARCH_FIELDS = ('first_name', 'last_name', 'email')
+
+
+def words(text):
+    """Returns the distinct lowercased, accent-stripped words in the text, in order"""
+    text = unicodedata.normalize('NFKD', force_text(text or ''))
+    text = ''.join(c for c in text if not unicodedata.combining(c)).lower()
+    return list(OrderedDict.fromkeys(word[:TOKEN_LENGTH] for word in re.split(r'\W+', text, flags=re.UNICODE)
+                                     if word))
+
+
+def user_tokens(user):
+    """Returns the set of words, and their prefixes, that find the user"""
+    text = ' '.join(getattr(user, field, '') or '' for field in SEARCH_FIELDS)
+    tokens = set()
+    for word in words(text):
+        tokens.update(word[:length] for length in range(1, len(word) + 1))
+    return tokens
+
+
+def profile_model():
+    """Returns the model of the users' `profile`, or None if there is none"""
+    try:
+        return get_user_model()._meta.get_field('profile').related_model
+    except FieldDoesNotExist:
+        return None
+
+
+def user_site_id(user):
+    return getattr(getattr(user, 'profile', None), 'site_registered_id', None)
+
+
+def index_users(users):
+    """Replaces the search tokens of the users"""
+    users = list(users)
+    with transaction.atomic():
+        UserSearchToken.objects.filter(user__in=[user.pk for user in users]).delete()
+        UserSearchToken.objects.bulk_create([
+            UserSearchToken(user_id=user.pk, site_id=user_site_id(user), token=token)
+            for user in users for token in sorted(user_tokens(user))])
+
+
+def search_users(queryset, text, user_field='pk', site=None):
+    """
+    Filters the queryset to the users matching every word of the text.
+
+    `user_field` is the lookup from the queryset's model to the user's
+    primary key, e.g. 'user' for OrganizationUsers. With `site`, only users
+    registered on that site match.
+    """
+    for word in words(text):
+        tokens = UserSearchToken.objects.filter(token=word)
+        if site is not None:
+            tokens = tokens.filter(site=site)
+        queryset = queryset.filter(**{'{0}__in'.format(user_field): tokens.values('user_id')})
+    return queryset
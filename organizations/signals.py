@@ -5,6 +5,9 @@ user_kwargs = {"providing_args": ["user"]}
 user_added = django.dispatch.Signal(**user_kwargs)
 user_removed = django.dispatch.Signal(**user_kwargs)
 
+# Sent once per organization instead of user_removed by bulk removals
+users_removed = django.dispatch.Signal(providing_args=["users"])
+
 owner_kwargs = {"providing_args": ["old", "new"]}
 owner_changed = django.dispatch.Signal(**owner_kwargs)
 
@@ -1,6 +1,8 @@
 from __future__ import unicode_literals
 from django import template
 
+from organizations.memberships import get_memberships, supports_resolver
+
 register = template.Library()
 
 
@@ -12,9 +14,13 @@ def organization_users(context, org):
 
 @register.filter
 def is_admin(org, user):
+    if supports_resolver(org):
+        return get_memberships(user).is_admin(org)
     return org.is_admin(user)
 
 
 @register.filter
 def is_owner(org, user):
+    if supports_resolver(org):
+        return get_memberships(user).is_owner(org)
     return org.owner.organization_user.user == user
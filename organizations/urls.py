@@ -33,7 +33,7 @@ from .views import (OrganizationList, OrganizationDetail,
                     OrganizationUserCreate, OrganizationUserRemind, OrganizationUserDelete,
                     OrganizationUserAddFromActivity, OrganizationBulkDelete, OrganizationUserAddFromBrand,
                     OrganizationActivities, OrganizationDashboard, OrganizationDashboardActivity,
-                    OrganizationSubgroupsAjax)
+                    OrganizationSubgroupsAjax, OrganizationUserExport)
 
 
 urlpatterns = [
@@ -62,6 +62,9 @@ urlpatterns = [
     url(r'^(?P<organization_pk>[\d]+)/people/$',
         view=login_required(OrganizationUserList.as_view()),
         name="organization_user_list"),
+    url(r'^(?P<organization_pk>[\d]+)/people/export/$',
+        view=login_required(OrganizationUserExport.as_view()),
+        name="organization_user_export"),
     url(r'^(?P<organization_pk>[\d]+)/people/add/$',
         view=login_required(OrganizationUserCreate.as_view()),
         name="organization_user_add"),
@@ -24,7 +24,13 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 from __future__ import unicode_literals
+import logging
+import time
 from itertools import chain
+from multiprocessing import TimeoutError
+from multiprocessing.pool import ThreadPool
+
+from django.db import connection
 
 from .models import Organization
 
@@ -99,3 +105,44 @@ def model_field_attr(model, model_field, attr):
     """
     fields = dict([(field.name, field) for field in model._meta.fields])
     return getattr(fields[model_field], attr)
+
+
+def map_concurrently(function, items, concurrency, timeout):
+    """
+    Calls `function` on each item from at most `concurrency` threads and
+    returns the results in order.
+
+    The result of any call that raised, or that had not finished `timeout`
+    seconds after this was called, is None. Late calls carry on in the
+    background but nothing waits for them, and calls still queued at the
+    deadline are skipped.
+    """
+    items = list(items)
+    if not items:
+        return []
+    deadline = time.time() + timeout
+
+    def call(item):
+        if time.time() >= deadline:
+            return None
+        try:
+            return function(item)
+        finally:
+            # Each worker thread opens its own database connection
+            connection.close()
+
+    pool = ThreadPool(min(concurrency, len(items)))
+    try:
+        pending = [pool.apply_async(call, (item,)) for item in items]
+        results = []
+        for result in pending:
+            try:
+                results.append(result.get(max(deadline - time.time(), 0)))
+            except TimeoutError:
+                results.append(None)
+            except Exception:
+                logging.getLogger(__name__).exception("Concurrent call to {0!r} failed".format(function))
+                results.append(None)
+        return results
+    finally:
+        pool.close()
@@ -2,25 +2,28 @@ from __future__ import division
 from __future__ import unicode_literals
 
 import calendar
+import csv
+import itertools
 import json
 import logging
 import tempfile
 from datetime import datetime
+from functools import partial
 
 import inject
-from builtins import range
 from builtins import str
 from dateutil.relativedelta import relativedelta
 from django.contrib import messages
-from django.contrib.auth.models import User
 from django.contrib.sites.models import Site
 from django.contrib.sites.shortcuts import get_current_site
 from django.core.exceptions import PermissionDenied
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.urlresolvers import reverse
-from django.db import IntegrityError
-from django.db.models import Q
-from django.http import HttpResponse, HttpResponseBadRequest
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.http import HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
+from django.utils import six
+from django.utils.encoding import force_text
 from django.utils.timezone import utc
 from django.utils.translation import ugettext
 from django.utils.translation import ugettext as _
@@ -28,7 +31,6 @@ from django.views.generic import (ListView, DetailView, UpdateView, CreateView,
         DeleteView, FormView)
 from django.views.generic import (TemplateView)
 from django.views.generic import View
-from past.utils import old_div
 from pure_pagination.paginator import Paginator, PageNotAnInteger
 from pymongo.database import Database
 from guardian.shortcuts import get_objects_for_organization, assign_perm, remove_perm, get_objects_for_user, \
@@ -40,13 +42,57 @@ from mycoracle import utils as mycoracle_utils
 from mycoracle.forms import ActivityAndUsersForm, AdvancedModelMultipleChoiceField, BrandUsersForm, \
     BundledModelMultipleChoiceField
 from TinCanApp.tincandb import TinCanActivityProfile
+from . import app_settings
+from .activity_stats import (activity_histograms, closed_months, moderated_activities, month_start,
+                             month_statistics, monthly_statistics)
 from .backends import invitation_backend, registration_backend
 from .forms import (OrganizationForm, OrganizationUserForm,
                     OrganizationUserAddForm, OrganizationAddForm, SignUpForm)
+from .cache import get_dashboard_context
+from .memberships import get_memberships
 from .mixins import (OrganizationMixin, OrganizationUserMixin,
                      MembershipRequiredMixin, AdminRequiredMixin, OwnerRequiredMixin, StaffRequiredMixin)
-from .models import Organization, OrganizationUser
-from .utils import create_organization
+from .models import ActivityStatistics, MemberSelection, Organization, OrganizationUser
+from .pagination import CursorPaginator
+from .search import profile_model, search_users
+from .utils import create_organization, map_concurrently
+
+
+def report_added_users(request, outcomes):
+    """
+    Adds messages for the users `Organization.add_users` could not add and
+    returns how many were added.
+    """
+    for pk, outcome in sorted(outcomes.items()):
+        if outcome == "missing":
+            messages.error(request, _(u"This user ({0}) does not exist").format(pk))
+        elif outcome == "ineligible":
+            messages.error(request, _(u"This user ({0}) is not registered to this group's site").format(pk))
+    return len([outcome for outcome in outcomes.values() if outcome == "added"])
+
+
+def visible_members(request, members, is_admin):
+    """
+    Members of hidden groups are only shown to the group's admins, brand
+    supervisors and the members themselves.
+    """
+    if not (is_admin or request.user.profile.is_brand_supervisor()):
+        members = members.filter(Q(organization__is_hidden=False) | Q(user=request.user))
+    return members
+
+
+class Echo(object):
+    """A file-like object that returns what is written, for streaming csv"""
+
+    def write(self, value):
+        return value
+
+
+def csv_value(value):
+    if value is None:
+        return ""
+    value = value.isoformat() if hasattr(value, "isoformat") else force_text(value)
+    return value.encode("utf-8") if six.PY2 else value
 
 
 class BaseOrganizationList(ListView):
@@ -69,12 +115,9 @@ class BaseOrganizationList(ListView):
         if context_object_name is not None:
             context[context_object_name] = qs
         organizations = list()
+        memberships = get_memberships(self.request.user)
         for o in qs:
-            try:
-                OrganizationUser.active.get(organization=o, user=self.request.user)
-                o.user_is_member = True
-            except OrganizationUser.DoesNotExist:
-                o.user_is_member = False
+            o.user_is_member = memberships.is_member(o)
             organizations.append(o)
         context["organizations"] = organizations
         return super(BaseOrganizationList, self).get_context_data(**context)
@@ -84,24 +127,18 @@ class BaseOrganizationDetail(OrganizationMixin, DetailView):
     def get_context_data(self, **kwargs):
         context = super(BaseOrganizationDetail, self).get_context_data(**kwargs)
         same_site_only = self.organization.site is not None
-        context['num_organization_users'] = len(
-            self.organization.get_members(same_site_only=same_site_only))
+        context['num_organization_users'] = self.organization.get_members(same_site_only=same_site_only).count()
         context['recent_users'] = \
             self.organization.get_members(same_site_only=same_site_only).order_by("-date_created", "user__first_name")[0:5]
         context['activities'] = \
             get_objects_for_organization(self.organization, "access_activity", mycoracle_models.ActivityProfile).filter(active=True)
         context['organization'] = self.organization
         context['subgroups'] = self.organization.get_subgroups().order_by("name")
-        context["is_admin"] = self.organization.is_admin(self.request.user)
+        memberships = get_memberships(self.request.user)
+        context["is_admin"] = memberships.is_admin(self.organization)
 
         # Superusers can get here without having an OrganisationUser
-        context['this_organization_user'] = None
-        try:
-            context['this_organization_user'] = OrganizationUser.objects.get(
-                organization=self.organization,
-                user=self.request.user)
-        except OrganizationUser.DoesNotExist:
-            pass
+        context['this_organization_user'] = memberships.get(self.organization)
         return context
 
 
@@ -148,36 +185,37 @@ class BaseOrganizationUserList(OrganizationMixin, ListView):
             request.session["POST"] = request.POST.copy()
 
         group_form = mycoracle_forms.ParticipantSortForm(request.session.get("POST"))
-        if group_form.is_valid():
-            if len(group_form.cleaned_data["search_text"].split()) < 2:
-                kwargs["first_name"] = group_form.cleaned_data["search_text"]
-                kwargs["last_name"] = group_form.cleaned_data["search_text"]
-            else:
-                names = group_form.cleaned_data["search_text"].split()
-                kwargs["first_name"] = names[0]
-                kwargs["last_name"] = names[1]
-
-        if "first_name" in kwargs and "last_name" in kwargs:
-            self.object_list = self.organization.get_members().filter(
-                Q(user__first_name__icontains=kwargs["first_name"]) |
-                Q(user__last_name__icontains=kwargs["last_name"]) |
-                Q(user__email__icontains=group_form.cleaned_data["search_text"])
-            )
+        searching = group_form.is_valid()
+        if searching:
+            self.object_list = search_users(self.organization.get_members(),
+                                            group_form.cleaned_data["search_text"], "user")
         else:
             self.object_list = self.organization.get_members(same_site_only=same_site_only)
 
-        if not (self.request.user.profile.is_brand_supervisor() or self.organization.is_admin(self.request.user)):
-            self.object_list = self.object_list.filter(Q(organization__is_hidden=False) | Q(user=self.request.user))
+        is_admin = get_memberships(self.request.user).is_admin(self.organization)
+        self.object_list = visible_members(request, self.object_list, is_admin)
 
         sortorder = ""
         sortfield = "first_name"
         if request.session.get("POST"):
             sortorder = "" if group_form.cleaned_data["sort_order"] == "+" else "-"
             sortfield = group_form.cleaned_data["sort_field"]
-        self.object_list = self.object_list.order_by("{0}user__{1}".format(sortorder, sortfield))
-        total_members = self.object_list.count()
-
-        p = Paginator(self.object_list, 40).page(page)
+        order = "{0}user__{1}".format(sortorder, sortfield)
+        if app_settings.ORGS_CURSOR_PAGINATION:
+            # The stored member_count only matches lists showing every membership row
+            unfiltered = not (searching or same_site_only or self.organization.is_hidden)
+            if not app_settings.ORGS_APPROXIMATE_TOTALS:
+                total = self.object_list.count
+            elif unfiltered:
+                total = self.organization.member_count
+            else:
+                total = None
+            p = CursorPaginator(self.object_list, order, 40, total=total).page(request.GET.get("cursor"))
+            total_members = p.total
+        else:
+            self.object_list = self.object_list.order_by(order)
+            total_members = self.object_list.count()
+            p = Paginator(self.object_list, 40).page(page)
         self.object_list = p.object_list
         context = self.get_context_data(object_list=self.object_list,
                                         organization_users=self.object_list,
@@ -185,7 +223,7 @@ class BaseOrganizationUserList(OrganizationMixin, ListView):
                                         pager=p)
 
         context["can_add"] = request.user.profile.is_brand_supervisor()
-        context["can_remove"] = self.organization.is_admin(self.request.user)
+        context["can_remove"] = is_admin
         group_form = mycoracle_forms.ParticipantSortForm(request.session.get("POST"))
         context["participant_form"] = group_form
         context["total_members"] = total_members
@@ -193,13 +231,71 @@ class BaseOrganizationUserList(OrganizationMixin, ListView):
 
     def post(self, request, *args, **kwargs):
         if request.POST.get("action") == "bulk-delete":
-            request.session["myc_organisations_users_to_delete"] = request.POST.getlist("users")
-            return redirect(reverse("organization_user_bulk_delete", args=(self.organization.pk,)))
+            selection = MemberSelection.create(self.organization, request.user, request.POST.getlist("users"))
+            return redirect("{0}?selection={1}".format(
+                reverse("organization_user_bulk_delete", args=(self.organization.pk,)), selection.token))
         else:
             request.session["POST"] = request.POST.copy()
             return self.get(request, *args, **kwargs)
 
 
+class BaseOrganizationUserExport(OrganizationMixin, View):
+    """
+    Streams the members shown by `BaseOrganizationUserList` as CSV, or as
+    JSON lines with `?format=jsonl`.
+
+    Rows are read as values in primary key order, a chunk at a time, so
+    neither the member list nor model instances are ever held in memory.
+    The site column is left empty when users have no `profile`.
+    """
+    fields = ("user__username", "user__email", "is_admin", "is_moderator", "date_created",
+              "user__profile__site_registered__domain")
+    headers = ("user", "email", "is_admin", "is_moderator", "date_created", "site")
+    chunk_size = 2000
+
+    def get_queryset(self):
+        organization = self.get_organization()
+        members = organization.get_members(same_site_only=organization.site is not None)
+        return visible_members(self.request, members, get_memberships(self.request.user).is_admin(organization))
+
+    def get_fields(self):
+        if profile_model() is None:
+            return [field for field in self.fields if not field.startswith("user__profile__")]
+        return list(self.fields)
+
+    def get_rows(self, queryset):
+        fields = self.get_fields()
+        missing = (None,) * (len(self.fields) - len(fields))
+        last_pk = 0
+        while True:
+            chunk = list(queryset.filter(pk__gt=last_pk).order_by("pk").values_list(
+                "pk", *fields)[:self.chunk_size])
+            if not chunk:
+                return
+            for row in chunk:
+                yield tuple(row[1:]) + missing
+            last_pk = chunk[-1][0]
+
+    def get(self, request, *args, **kwargs):
+        export_format = request.GET.get("format", "csv")
+        if export_format == "jsonl":
+            content_type = "application/x-ndjson"
+            lines = (json.dumps(dict(zip(self.headers, row)), cls=DjangoJSONEncoder) + "\n"
+                     for row in self.get_rows(self.get_queryset()))
+        elif export_format == "csv":
+            content_type = "text/csv"
+            writer = csv.writer(Echo())
+            lines = (writer.writerow([csv_value(value) for value in row])
+                     for row in self.get_rows(self.get_queryset()))
+            lines = itertools.chain([writer.writerow([csv_value(header) for header in self.headers])], lines)
+        else:
+            return HttpResponseBadRequest(_("Unknown export format"))
+        response = StreamingHttpResponse(lines, content_type=content_type)
+        response["Content-Disposition"] = 'attachment; filename="{0}-members.{1}"'.format(
+            self.organization.slug, export_format)
+        return response
+
+
 class BaseOrganizationUserDetail(OrganizationUserMixin, DetailView):
     pass
 
@@ -209,8 +305,9 @@ class BaseOrganizationUserCreate(OrganizationMixin, CreateView):
     template_name = 'organizations/organizationuser_form.html'
 
     def get_success_url(self):
+        # The form saves an OrganizationInvitation for addresses without a user
         return reverse('organization_user_list',
-                kwargs={'organization_pk': self.object.organization.pk})
+                kwargs={'organization_pk': self.organization.pk})
 
     def get_form_kwargs(self):
         kwargs = super(BaseOrganizationUserCreate, self).get_form_kwargs()
@@ -239,8 +336,9 @@ class BaseOrganizationUserRemind(OrganizationUserMixin, DetailView):
 
     def post(self, request, *args, **kwargs):
         self.object = self.get_object()
-        invitation_backend().send_reminder(self.object.user,
-                **{'domain': get_current_site(self.request),
+        site = get_current_site(self.request)
+        invitation_backend(site).send_reminder(self.object.user,
+                **{'domain': site,
                     'organization': self.organization, 'sender': request.user})
         return redirect(self.object)
 
@@ -251,8 +349,9 @@ class BaseOrganizationUserUpdate(OrganizationUserMixin, UpdateView):
 
 class BaseOrganizationUserDelete(OrganizationUserMixin, DeleteView):
     def get_success_url(self):
+        # The form saves an OrganizationInvitation for addresses without a user
         return reverse('organization_user_list',
-                kwargs={'organization_pk': self.object.organization.pk})
+                kwargs={'organization_pk': self.organization.pk})
 
 
 class OrganizationSignup(FormView):
@@ -318,36 +417,56 @@ class OrganizationDelete(OwnerRequiredMixin, BaseOrganizationDelete):
 class OrganizationBulkDelete(StaffRequiredMixin, OrganizationMixin, TemplateView):
     template_name = "organizations/organizationuser_confirm_bulk_delete.html"
 
+    def get_selection(self):
+        token = self.request.GET.get("selection") or self.request.POST.get("selection")
+        return MemberSelection.objects.filter(
+            token=token, organization_id=self.organization.pk, user_id=self.request.user.pk).first()
+
     def get(self, request, *args, **kwargs):
-        if not request.session.get("myc_organisations_users_to_delete"):
+        self.selection = self.get_selection()
+        if self.selection is None:
             return redirect(reverse("organization_user_list", args=(self.organization.pk,)))
         return super(OrganizationBulkDelete, self).get(request, args, kwargs)
 
     def post(self, request, *args, **kwargs):
-        if request.POST.get("confirm_yes"):
-            users_to_delete = self.request.session.get("myc_organisations_users_to_delete")
-            organization_users = OrganizationUser.objects.filter(
-                organization_id=self.organization.pk, user_id__in=users_to_delete)
+        selection = self.get_selection()
+        if request.POST.get("confirm_yes") and selection is not None:
+            # One query partitions the selection into members registered on
+            # this site, who may be removed, and everyone else
             brand = Site.objects.get_current().domain
-            for user in organization_users:
-                if user.user.profile.site_registered.domain != brand:
+            memberships = OrganizationUser.objects.filter(
+                organization_id=self.organization.pk, user_id__in=selection.get_user_ids()
+            ).annotate(on_site=Case(When(user__profile__site_registered__domain=brand, then=Value(1)),
+                                    default=Value(0), output_field=IntegerField()))
+            removable = []
+            for user_id, username, on_site in memberships.values_list("user_id", "user__username", "on_site"):
+                if on_site:
+                    removable.append(user_id)
+                else:
                     messages.add_message(request, messages.ERROR,
                                          "You tried to remove user {0} but user is not registered on the site".format(
-                                             user.user.username))
+                                             username))
                     logging.getLogger().warn("{0} tried to remove {1} from {2} - {1} not part of {3}".format(
-                        request.user.username, user.user.username, self.organization, brand))
-                    users_to_delete.remove(str(user.user_id))
+                        request.user.username, username, self.organization, brand))
 
-            OrganizationUser.objects.filter(organization_id=self.organization.pk, user_id__in=users_to_delete).delete()
-            messages.add_message(request, messages.SUCCESS, "%d people removed from group" % len(users_to_delete))
+            outcomes = self.organization.remove_users(removable, include_subgroups=False, batch_signal=True)
+            removed = len([outcome for outcome in outcomes.values() if outcome == "removed"])
+            if removed < len(removable):
+                messages.add_message(request, messages.ERROR, "The group owner cannot be removed")
+            selection.delete()
+            messages.add_message(request, messages.SUCCESS, "%d people removed from group" % removed)
 
             return redirect(reverse("organization_user_list", args=(self.organization.pk,)))
         elif request.POST.get("confirm_no"):
+            if selection is not None:
+                selection.delete()
             return redirect(reverse("organization_user_list", args=(self.organization.pk,)))
+        return redirect(reverse("organization_user_list", args=(self.organization.pk,)))
 
     def get_context_data(self, **kwargs):
         context = super(OrganizationBulkDelete, self).get_context_data(**kwargs)
-        context["users_to_delete"] = self.request.session.get("myc_organisations_users_to_delete")
+        context["users_to_delete"] = self.selection.get_user_ids()
+        context["selection"] = self.selection.token
         return context
 
 
@@ -355,6 +474,10 @@ class OrganizationUserList(MembershipRequiredMixin, BaseOrganizationUserList):
     pass
 
 
+class OrganizationUserExport(MembershipRequiredMixin, BaseOrganizationUserExport):
+    pass
+
+
 class OrganizationUserDetail(AdminRequiredMixin, BaseOrganizationUserDetail):
     pass
 
@@ -395,9 +518,15 @@ class OrganizationUserAddFromActivity(AdminRequiredMixin, OrganizationMixin, Tem
             mycoracle_models.ActivityProfile = request.session.get("organisation_users_current_activity")
             form.fields["activities"].initial = mycoracle_models.ActivityProfile.pk
             q = get_users_with_permission(mycoracle_models.ActivityProfile, "access_activity")
-            p = Paginator(q, 40, request=request).page(page)
+            if app_settings.ORGS_CURSOR_PAGINATION:
+                total = None if app_settings.ORGS_APPROXIMATE_TOTALS else q.count
+                p = CursorPaginator(q, "pk", 40, total=total).page(request.GET.get("cursor"))
+                page_users = q.filter(pk__in=[user.pk for user in p]).order_by("pk")
+            else:
+                p = Paginator(q, 40, request=request).page(page)
+                page_users = p.object_list
             form.fields["users"] = AdvancedModelMultipleChoiceField(
-                queryset=p.object_list)
+                queryset=page_users)
             # for uop in form.fields["users"]:
             # if self.organization.is_member(uop.user):
             #      pass
@@ -425,14 +554,8 @@ class OrganizationUserAddFromActivity(AdminRequiredMixin, OrganizationMixin, Tem
                 "activities": get_objects_for_user(request.user, "administer_activity", mycoracle_models.ActivityProfile)
             })
 
-            for u in form["users"].value():
-                try:
-                    user = User.objects.get(int(u))
-                    self.organization.add_user(user)
-                except User.DoesNotExist:
-                    messages.error(request, _(u"This user ({0}) does not exist".format(u)))
-                except IntegrityError:
-                    pass
+            outcomes = self.organization.add_users(form["users"].value())
+            report_added_users(request, outcomes)
             return redirect(reverse("organization_user_list", args=(self.organization.id,)))
 
 
@@ -452,38 +575,23 @@ class OrganizationUserAddFromBrand(StaffRequiredMixin, OrganizationMixin, Templa
         except PageNotAnInteger:
             page = 1
 
-        if "participant_go" in request.GET:
-            if len(request.GET["searchbox"].split()) < 2:
-                kwargs["first_name"] = request.GET["searchbox"]
-                kwargs["last_name"] = request.GET["searchbox"]
-            else:
-                names = request.GET["searchbox"].split()
-                kwargs["first_name"] = names[0]
-                kwargs["last_name"] = names[1]
-
-        current_users = []
-        for user in OrganizationUser.objects.filter(organization=self.organization):
-            current_users += [user.user.pk]
         if request.user.is_superuser:
-            if "first_name" in kwargs and "last_name" in kwargs:
-                q = User.objects.filter(~Q(pk__in=current_users), Q(first_name__icontains=kwargs["first_name"]) | Q(
-                    last_name__icontains=kwargs["last_name"]),
-                                        is_active=True, profile__site_registered=get_current_site(request))
-            else:
-                q = User.objects.filter(~Q(pk__in=current_users), is_active=True,
-                                        profile__site_registered=get_current_site(request))
+            site = get_current_site(request)
         else:
-            if "first_name" in kwargs and "last_name" in kwargs:
-                q = User.objects.filter(~Q(pk__in=current_users), Q(first_name__icontains=kwargs["first_name"]) | Q(
-                    last_name__icontains=kwargs["last_name"]),
-                                        is_active=True, profile__site_registered=request.user.profile.site_registered)
-            else:
-                q = User.objects.filter(~Q(pk__in=current_users), is_active=True,
-                                        profile__site_registered=request.user.profile.site_registered)
-        q = q.order_by("first_name")
-        p = Paginator(q, 40, request=request).page(page)
+            site = request.user.profile.site_registered
+        q = self.organization.non_member_candidates(site=site)
+        if "participant_go" in request.GET:
+            q = search_users(q, request.GET["searchbox"], site=site)
+        if app_settings.ORGS_CURSOR_PAGINATION:
+            total = None if app_settings.ORGS_APPROXIMATE_TOTALS else q.count
+            p = CursorPaginator(q, "first_name", 40, total=total).page(request.GET.get("cursor"))
+            page_users = q.filter(pk__in=[user.pk for user in p]).order_by("first_name", "pk")
+        else:
+            q = q.order_by("first_name")
+            p = Paginator(q, 40, request=request).page(page)
+            page_users = p.object_list
         form.fields["users"] = BundledModelMultipleChoiceField(
-            queryset=p.object_list)
+            queryset=page_users)
         # for uop in form.fields["users"]:
         # if self.organization.is_member(uop.user):
         #      pass
@@ -508,18 +616,9 @@ class OrganizationUserAddFromBrand(StaffRequiredMixin, OrganizationMixin, Templa
                 "activities": get_objects_for_user(request.user, "administer_activity", mycoracle_models.ActivityProfile)
             })
 
-            c = 0
-            for u in form["users"].value():
-                try:
-                    user = User.objects.get(pk=int(u))
-                    self.organization.add_user(user)
-                    c += 1
-                except IntegrityError as ie:
-                    messages.warning(request, ie.message)
-                except User.DoesNotExist:
-                    messages.error(request, _(u"This user ({0}) does not exist".format(u)))
-
-            messages.success(request, "{0} users added to group {1}".format(c, self.organization))
+            outcomes = self.organization.add_users(form["users"].value())
+            added = report_added_users(request, outcomes)
+            messages.success(request, "{0} users added to group {1}".format(added, self.organization))
             return redirect(reverse("organization_user_list", args=(self.organization.id,)))
 
 
@@ -576,7 +675,12 @@ class OrganizationSubgroupsAjax(OrganizationMixin, View):
 
 class OrganizationDashboard(StaffRequiredMixin, OrganizationMixin, TemplateView):
     template_name = "organizations/organization_dashboard.html"
-    context = dict()
+    NO_PROFILE = object()
+    # The period picked in the form. Set on the view instance, which lives
+    # for one request, so concurrent requests never share it.
+    monthly = False
+    start = None
+    end = None
 
     def post(self, request, *args, **kwargs):
         month = request.POST.get("month")
@@ -594,68 +698,73 @@ class OrganizationDashboard(StaffRequiredMixin, OrganizationMixin, TemplateView)
         period_start = datetime(int(year), int(month), 1, tzinfo=utc)
         period_end = period_start + relativedelta(months=1)
 
-        self.context["period_start"] = None
-        if monthly:
-            self.context["period_start"] = period_start.strftime("%b %Y")
-        self.context["monthly"] = monthly
-        self.context["start"] = period_start
-        self.context["end"] = period_end
+        self.monthly = monthly
+        self.start = period_start
+        self.end = period_end
 
         return self.get(request, *args, **kwargs)
 
     @inject.param("ap_repo", TinCanActivityProfile)
     def get(self, request, *args, **kwargs):
-        self.context["organization"] = self.organization
+        context = {
+            "organization": self.organization,
+            "period_start": self.start.strftime("%b %Y") if self.monthly else None,
+            "monthly": self.monthly,
+            "start": self.start,
+            "end": self.end,
+            "acts": [],
+        }
 
         # moddables = list(
         #     get_objects_for_organization(
         #         kwargs["organization_pk"], "access_activity", mycoracle_models.ActivityProfile).order_by("name")
         # )
         siteprofile = mycoracle_utils.get_current_user_site_profile(self.request.user)
-        try:
-            orgnization_activities = mycoracle_models.OrganizationActivity.objects.get(
-                site=siteprofile.site,
-                organization=self.organization,
-                active=True
-            )
-            moddables = list()
-            for ag in orgnization_activities.activity_groups.all():
-                moddables += [a for a in ag.activities.all()]
-            moddables += [a for a in orgnization_activities.activities.all()]
-        except mycoracle_models.OrganizationActivity.DoesNotExist:
-            moddables = list(mycoracle_models.ActivityProfile.objects.filter(siteprofile__site=Site.objects.get_current()))
+        moddables = moderated_activities(self.organization, siteprofile.site)
         if len(moddables) == 0:
             messages.warning(request, _("There are no activities to moderate"))
             return redirect(reverse("organization_detail", args=(self.organization.pk,)))
 
-        self.context["acts"] = list()
-        organization_users = self.organization.get_members()
-        users_in_group = []
-        for user in organization_users:
-            users_in_group += [str(user.user_id)]
-
-        self.context["statistic_date"] = mycoracle_forms.StatisticsDateForm(request.POST)
-        for a in moddables:
-            if not a.active:
-                continue
-            tcprofile = kwargs["ap_repo"].GetSingleActivityProfile({
-                "profileId": "outline",
-                "activityId": a.url
-            })
-
-            if not tcprofile:
+        total_users = self.organization.get_members().count()
+
+        context["statistic_date"] = mycoracle_forms.StatisticsDateForm(request.POST)
+        activities = [a for a in moddables if a.active]
+        rolled_up = {}
+        if self.monthly and closed_months([self.start]):
+            rolled_up = dict((row.activity_url, row) for row in ActivityStatistics.objects.filter(
+                organization=self.organization, month=month_start(self.start)))
+        live = [a for a in activities if a.url not in rolled_up]
+        stats = dict(zip(live, map_concurrently(
+            partial(self.get_statistics, kwargs["ap_repo"], Site.objects.get_current()),
+            live, app_settings.ORGS_DASHBOARD_CONCURRENCY, app_settings.ORGS_DASHBOARD_TIMEOUT)))
+        stats.update((a, rolled_up[a.url].apply_to(a)) for a in activities if a.url in rolled_up)
+        for a in activities:
+            stat = stats[a]
+            if stat is self.NO_PROFILE:
                 continue
+            if stat is None:
+                # Still loading or failed; list the activity without statistics
+                stat = a
+                stat.timed_out = True
+            stat.total_users = total_users
+            context["acts"].append(stat)
+        return self.render_to_response(context)
 
-            brand = Site.objects.get_current()
-            if self.context.get("monthly"):
-                a = mycoracle_utils.GetStatistics(
-                    tcProfile=tcprofile, activity=a, organisation=self.organization,
-                    brand=brand, monthly=True, start=self.context["start"], end=self.context["end"])
-            else:
-                a = mycoracle_utils.GetStatistics(tcProfile=tcprofile, activity=a, organisation=self.organization, brand=brand)
-            a.total_users = len(users_in_group)
-            self.context["acts"].append(a)
-        return self.render_to_response(self.context)
+    def get_statistics(self, ap_repo, brand, activity):
+        """
+        Fetches the activity's profile and computes its statistics. Called
+        from worker threads, so it only reads the request's state.
+        """
+        tcprofile = ap_repo.GetSingleActivityProfile({
+            "profileId": "outline",
+            "activityId": activity.url
+        })
+        if not tcprofile:
+            return self.NO_PROFILE
+        if self.monthly:
+            return month_statistics(tcprofile, activity, self.organization, brand, self.start)
+        return mycoracle_utils.GetStatistics(
+            tcProfile=tcprofile, activity=activity, organisation=self.organization, brand=brand)
 
 
 class OrganizationDashboardActivity(TemplateView):
@@ -702,75 +811,47 @@ class OrganizationDashboardActivity(TemplateView):
             cansee = True
         if not cansee:
             raise PermissionDenied
-        users_in_group = [
-            str(user["user_id"]) for user in
-            organization.get_members().values("user_id")]
+        # Every moderator sees the same charts, until the group's members change
+        period = "{0:%Y-%m}".format(datetime.now())
+        ctx = dict(get_dashboard_context(
+            organization.pk, activityprofile.pk, period,
+            lambda: self.get_charts(activityprofile, organization, kwargs["ap_repo"], kwargs["db"])))
+        ctx["activity"] = activityprofile
+        return self.render_to_response(ctx)
 
+    def get_charts(self, activityprofile, organization, ap_repo, db):
+        """
+        Returns the chart context for the activity's page, and whether every
+        month's statistics were available for it.
+        """
         xdata = ["0-25%", "25-50%", "50-75%", "75-100%"]
-        tcprofile = kwargs["ap_repo"].GetSingleActivityProfile({
+        tcprofile = ap_repo.GetSingleActivityProfile({
             "profileId": "outline",
             "activityId": activityprofile.url
         })
         stmts = 0
-        testees = []
-        test_bucket_hash = {}
         test_bucket_info = {}
         ctx = dict()
+        complete = True
         if tcprofile:
             for x in tcprofile["objects"]:
                 stmts += 1
                 for v in x.get("verbs"):
                     if v.get("has_score"):
-                        testees.append(x["id"])
-                        test_bucket_hash[x["id"]] = [0, 0, 0, 0]
                         test_bucket_info[x["id"]] = {
                             "name": x["name"]
                         }
 
-            res = kwargs["db"].activitystates.find({
-                "stateId": "progress-by-id",
-                "activityId": activityprofile.url,
-                "agent.account.name": {"$in": users_in_group}
-            })
-            buckets = [0, 0, 0, 0]
-            test_buckets = [0, 0, 0, 0]
-            if stmts > 0:
-                for x in res:
-                    if not x.get("state"):
-                        continue
-
-                    s = len(x["state"])
-                    if old_div(float(s), stmts) < 0.25:
-                        buckets[0] += 1
-                    elif old_div(float(s), stmts) < 0.5:
-                        buckets[1] += 1
-                    elif old_div(float(s), stmts) < 0.75:
-                        buckets[2] += 1
-                    else:
-                        buckets[3] += 1
-                    if test_buckets:
-                        pass
-
-                    for s in x["state"]:
-                        if s["id"] in testees:
-                            for v in s["verbs"]:
-                                if v.get("result"):
-                                    score = v["result"]["score"]["scaled"]
-                                    if score < 0.25:
-                                        test_bucket_hash[s["id"]][0] += 1
-                                    elif score < 0.5:
-                                        test_bucket_hash[s["id"]][1] += 1
-                                    elif score < 0.75:
-                                        test_bucket_hash[s["id"]][2] += 1
-                                    else:
-                                        test_bucket_hash[s["id"]][3] += 1
+            buckets, test_bucket_hash = activity_histograms(
+                db.activitystates, activityprofile.url, organization.member_id_chunks(), stmts,
+                list(test_bucket_info))
 
             chartdata1 = {'x': xdata, 'name1': 'Participants', 'y1': buckets}
             chartdata2 = {'x': xdata}
-            for x in range(0, len(list(test_bucket_hash.keys()))):
+            for x, testee in enumerate(test_bucket_hash):
                 chartdata2.update({
-                    "name{0}".format(x + 1): test_bucket_info[list(test_bucket_hash.keys())[x]]["name"],
-                    "y{0}".format(x + 1): test_bucket_hash[list(test_bucket_hash.keys())[x]]
+                    "name{0}".format(x + 1): test_bucket_info[testee]["name"],
+                    "y{0}".format(x + 1): test_bucket_hash[testee]
                 })
 
             charttype1 = "discreteBarChart"
@@ -797,18 +878,8 @@ class OrganizationDashboardActivity(TemplateView):
             start = end - relativedelta(months=12)
             year = list(mycoracle_utils.daterange(start, end))
             xdata = [1000 * int(calendar.timegm(y.timetuple())) for y in year]
-            tcp = kwargs["ap_repo"].GetSingleActivityProfile({
-                "profileId": "outline",
-                "activityId": activityprofile.url
-            })
-
             brand = Site.objects.get_current()
-            stats = [mycoracle_utils.GetStatistics(
-                tcProfile=tcp, activity=activityprofile, organisation=organization,
-                brand=brand, monthly=True, start=month) for month in year]
-
-            ydata = [[stat.num_started for stat in stats], [stat.average_statements for stat in stats],
-                     [stat.average_visit_time for stat in stats], [stat.test_passed_percent for stat in stats]]
+            ydata, complete = monthly_statistics(tcprofile, activityprofile, organization, year, brand)
 
             data = \
                 {
@@ -899,5 +970,4 @@ class OrganizationDashboardActivity(TemplateView):
             data["chartdata7"]["y1"] = [stat[1] for stat in pagestats]
             ctx.update(data)
 
-        ctx["activity"] = activityprofile
-        return self.render_to_response(ctx)
+        return ctx, complete
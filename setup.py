@@ -32,6 +32,8 @@ setup(
     packages=[
         'organizations',
         'organizations.backends',
+        'organizations.management',
+        'organizations.management.commands',
         'organizations.migrations',
         'organizations.templatetags',
     ],
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""
+Compares the per-message cost of rendering notification emails:
+
+- uncached: a fresh backend per email, so both templates are looked up and
+  parsed every time (the behaviour before templates were cached)
+- cached: `_send_email` on one backend, which reuses compiled templates
+- send_many: one call rendering every email and sending them together
+
+Run from the repository root with `python tests/benchmark_email.py [count]`.
+Nothing is written to the database; the emails go to the locmem backend.
+"""
+from __future__ import print_function
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import manage  # noqa: configures the test settings
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sites.models import Site
+from django.core import mail
+
+from organizations.backends.defaults import InvitationBackend
+from organizations.models import Organization
+
+settings.EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+
+
+def timed(label, count, function):
+    mail.outbox = []
+    started = time.time()
+    function()
+    elapsed = time.time() - started
+    assert len(mail.outbox) == count
+    print("{0:<10} {1:8.1f} us/message".format(label, elapsed / count * 1e6))
+
+
+def main(count):
+    sender = User(pk=1, first_name="Dave", last_name="Grohl", email="dave@example.com")
+    users = [User(pk=i, first_name="User", last_name="{0}".format(i), email="user{0}@example.com".format(i))
+             for i in range(2, count + 2)]
+    context = {'organization': Organization(pk=1, name="Foo Fighters"),
+               'domain': Site(domain="example.com", name="Example")}
+    templates = (InvitationBackend.notification_subject, InvitationBackend.notification_body)
+
+    def uncached():
+        for user in users:
+            InvitationBackend()._send_email(user, templates[0], templates[1], sender, **context)
+
+    def cached():
+        backend = InvitationBackend()
+        for user in users:
+            backend._send_email(user, templates[0], templates[1], sender, **context)
+
+    def many():
+        InvitationBackend().send_many(users, templates, context, sender=sender)
+
+    print("{0} notification emails".format(count))
+    timed("uncached", count, uncached)
+    timed("cached", count, cached)
+    timed("send_many", count, many)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+"""
+Compares the cost of bucketing activity states in Python:
+
+- loop: the dashboard's original per-document if/elif chains with a list
+  lookup for scored statements
+- python: `count_histograms` with a dictionary index and without NumPy
+- numpy: `count_histograms` with NumPy's searchsorted and bincount
+
+Run from the repository root with `python tests/benchmark_histograms.py [count]`.
+The documents are generated in memory; no Mongo server is needed.
+"""
+from __future__ import division, print_function
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import manage  # noqa: configures the test settings
+from organizations import activity_stats
+
+STATEMENTS = 40
+TESTEES = ["test-{0}".format(i) for i in range(10)]
+
+
+def loop(documents, statements, testees):
+    buckets = [0, 0, 0, 0]
+    test_bucket_hash = dict((testee, [0, 0, 0, 0]) for testee in testees)
+    for x in documents:
+        s = len(x["state"])
+        if float(s) / statements < 0.25:
+            buckets[0] += 1
+        elif float(s) / statements < 0.5:
+            buckets[1] += 1
+        elif float(s) / statements < 0.75:
+            buckets[2] += 1
+        else:
+            buckets[3] += 1
+        for s in x["state"]:
+            if s["id"] in testees:
+                for v in s["verbs"]:
+                    if v.get("result"):
+                        score = v["result"]["score"]["scaled"]
+                        if score < 0.25:
+                            test_bucket_hash[s["id"]][0] += 1
+                        elif score < 0.5:
+                            test_bucket_hash[s["id"]][1] += 1
+                        elif score < 0.75:
+                            test_bucket_hash[s["id"]][2] += 1
+                        else:
+                            test_bucket_hash[s["id"]][3] += 1
+    return buckets, test_bucket_hash
+
+
+def documents(count):
+    ids = ["statement-{0}".format(i) for i in range(STATEMENTS - len(TESTEES))] + TESTEES
+    for _ in range(count):
+        states = []
+        for statement in random.sample(ids, random.randint(1, STATEMENTS)):
+            if statement in TESTEES:
+                states.append({"id": statement, "verbs": [{"result": {"score": {"scaled": random.random()}}}]})
+            else:
+                states.append({"id": statement, "verbs": [{"id": "read"}]})
+        yield {"state": states}
+
+
+def timed(label, function, docs):
+    started = time.time()
+    result = function(docs, STATEMENTS, TESTEES)
+    print("{0:<8} {1:8.1f} ms".format(label, (time.time() - started) * 1000))
+    return result
+
+
+def main(count):
+    random.seed(0)
+    docs = list(documents(count))
+    print("{0} activity states".format(count))
+    expected = timed("loop", loop, docs)
+    numpy = activity_stats.numpy
+    activity_stats.numpy = None
+    assert timed("python", activity_stats.count_histograms, docs) == expected
+    activity_stats.numpy = numpy
+    if numpy is not None:
+        assert timed("numpy", activity_stats.count_histograms, docs) == expected
+    else:
+        print("numpy    not installed")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
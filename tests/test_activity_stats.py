@@ -0,0 +1,109 @@
+from datetime import date
+
+import mongomock
+from dateutil.relativedelta import relativedelta
+from django.core.management import call_command
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+from django.utils.six import StringIO
+from mock import Mock, patch
+
+from organizations.activity_stats import (activity_histograms, bucket, month_start, monthly_statistics,
+                                          python_histograms)
+from organizations.models import ActivityStatistics, Organization, RollupWatermark
+
+
+def state(statement, score=None):
+    verbs = [{"id": "answered", "result": {"score": {"scaled": score}}}] if score is not None else [{"id": "read"}]
+    return {"id": statement, "verbs": verbs}
+
+
+class ActivityHistogramTests(TestCase):
+
+    def setUp(self):
+        self.states = mongomock.MongoClient().db.activitystates
+        self.states.insert_many([
+            {"stateId": "progress-by-id", "activityId": "act", "agent": {"account": {"name": "1"}},
+             "state": [state("s1"), state("t1", 0.9)]},
+            {"stateId": "progress-by-id", "activityId": "act", "agent": {"account": {"name": "2"}},
+             "state": [state("s1"), state("s2"), state("t1", 0.1), state("t2", 0.5)]},
+            {"stateId": "progress-by-id", "activityId": "act", "agent": {"account": {"name": "3"}},
+             "state": []},
+            # Not a member, or another activity
+            {"stateId": "progress-by-id", "activityId": "act", "agent": {"account": {"name": "9"}},
+             "state": [state("s1")]},
+            {"stateId": "progress-by-id", "activityId": "other", "agent": {"account": {"name": "1"}},
+             "state": [state("s1")]},
+        ])
+        self.expected = ([0, 0, 1, 1], {"t1": [1, 0, 0, 1], "t2": [0, 0, 1, 0]})
+
+    def test_bucket(self):
+        self.assertEqual([0, 1, 1, 2, 3, 3], [bucket(value) for value in [0, 0.25, 0.3, 0.5, 0.75, 1.5]])
+
+    def test_histograms(self):
+        self.assertEqual(self.expected, activity_histograms(self.states, "act", [["1", "2", "3"]], 4, ["t1", "t2"]))
+
+    def test_chunked_histograms(self):
+        self.assertEqual(self.expected, activity_histograms(
+            self.states, "act", iter([["1"], ["2", "3"]]), 4, ["t1", "t2"]))
+
+    def test_python_fallback(self):
+        self.assertEqual(self.expected, python_histograms(self.states, "act", ["1", "2", "3"], 4, ["t1", "t2"]))
+
+    def test_no_statements(self):
+        self.assertEqual(([0, 0, 0, 0], {"t1": [0, 0, 0, 0]}),
+                         activity_histograms(self.states, "act", [["1", "2"]], 0, ["t1"]))
+
+
+@override_settings(USE_TZ=True)
+@patch('organizations.activity_stats.mycoracle_utils.GetStatistics',
+       return_value=Mock(num_started=3, average_statements=2.5, average_visit_time=60, test_passed_percent=50))
+class RollupTests(TestCase):
+
+    fixtures = ['users.json', 'orgs.json']
+
+    def setUp(self):
+        self.activity = Mock(active=True, url="act")
+        self.current = month_start(timezone.now())
+        self.nirvana = Organization.objects.get(name="Nirvana")
+
+    def rollup(self, *args):
+        with patch('organizations.management.commands.rollup_org_stats.moderated_activities',
+                   return_value=[self.activity]), \
+                patch('organizations.management.commands.rollup_org_stats.inject') as inject:
+            inject.instance.return_value.GetSingleActivityProfile.return_value = {"objects": []}
+            call_command("rollup_org_stats", *args, stdout=StringIO())
+
+    def test_rollup_from_watermark(self, statistics):
+        self.rollup("--months=2")
+        last = self.current - relativedelta(months=1)
+        self.assertEqual(last, RollupWatermark.objects.get().month)
+        # One row per active group and month
+        self.assertEqual(4, ActivityStatistics.objects.count())
+        self.assertEqual(3, ActivityStatistics.objects.get(organization=self.nirvana, month=last).num_started)
+        statistics.reset_mock()
+        self.rollup()
+        self.assertFalse(statistics.called)
+        RollupWatermark.objects.update(month=last - relativedelta(months=1))
+        self.rollup()
+        self.assertEqual(2, statistics.call_count)
+        self.assertEqual(4, ActivityStatistics.objects.count())
+
+    def test_closed_months_read_from_rollup(self, statistics):
+        closed = self.current - relativedelta(months=1)
+        ActivityStatistics.objects.create(organization=self.nirvana, activity_url="act", month=closed,
+                                          num_started=7)
+        series, complete = monthly_statistics({}, self.activity, self.nirvana, [closed, self.current])
+        self.assertEqual([[7, 3], [0, 2.5], [0, 60], [0, 50]], series)
+        self.assertTrue(complete)
+        self.assertEqual(1, statistics.call_count)
+
+    def test_failed_months_are_incomplete(self, statistics):
+        statistics.side_effect = ValueError
+        series, complete = monthly_statistics({}, self.activity, self.nirvana, [self.current])
+        self.assertEqual([[0], [0], [0], [0]], series)
+        self.assertFalse(complete)
+
+    def test_month_start(self, statistics):
+        self.assertEqual(date(2017, 3, 1), month_start(date(2017, 3, 31)))
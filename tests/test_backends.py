@@ -1,11 +1,22 @@
 from unittest import skip
+try:
+    from io import StringIO
+except ImportError:
+    from StringIO import StringIO
+
+from mock import patch
 from django.core import mail
+from django.core.exceptions import PermissionDenied
+from django.core.management import call_command
 from django.core.urlresolvers import reverse
 from django.contrib.auth.models import User
+from django.contrib.sites.models import Site
 from django.http import Http404, QueryDict
+from django.template import loader
 from django.test import TestCase
 from django.test.client import RequestFactory
 from django.test.utils import override_settings
+from django.utils import timezone
 
 from test_vendors.models import Vendor
 from test_abstract.models import CustomOrganization
@@ -13,7 +24,7 @@ from test_abstract.models import CustomOrganization
 from organizations.backends.defaults import (BaseBackend, InvitationBackend,
         RegistrationBackend)
 from organizations.backends.tokens import RegistrationTokenGenerator
-from organizations.models import Organization
+from organizations.models import Organization, OrganizationInvitation, OutgoingEmail
 from .utils import request_factory_login
 
 
@@ -43,6 +54,24 @@ class InvitationTests(TestCase):
         from organizations.backends import invitation_backend
         self.assertTrue(isinstance(invitation_backend(), InvitationBackend))
 
+    def test_backend_is_cached(self):
+        from organizations.backends import invitation_backend
+        self.assertIs(invitation_backend(), invitation_backend())
+        with override_settings(INVITATION_BACKEND='organizations.backends.defaults.RegistrationBackend'):
+            self.assertTrue(isinstance(invitation_backend(), RegistrationBackend))
+        self.assertTrue(isinstance(invitation_backend(), InvitationBackend))
+
+    def test_site_backend(self):
+        from organizations.backends import invitation_backend, register_backend, unregister_backend
+        site = Site.objects.get_current()
+        register_backend('invitation', RegistrationBackend, site)
+        try:
+            self.assertTrue(isinstance(invitation_backend(site), RegistrationBackend))
+            self.assertTrue(isinstance(invitation_backend(), InvitationBackend))
+        finally:
+            unregister_backend('invitation', site)
+        self.assertTrue(isinstance(invitation_backend(site), InvitationBackend))
+
     def test_create_user(self):
         invited = InvitationBackend().invite_by_email("sedgewick@example.com")
         self.assertTrue(isinstance(invited, User))
@@ -77,6 +106,52 @@ class InvitationTests(TestCase):
             self.pending_user.id,
             self.tokenizer.make_token(self.pending_user)).status_code)
 
+    def test_invite_many(self):
+        nirvana = Organization.objects.get(name="Nirvana")
+        added, invitations = InvitationBackend().invite_many(
+            ["Duder@Testing.com", "grunge@example.com", " GRUNGE@example.com"], nirvana, sender=self.user)
+        self.assertEqual(["duder"], [user.username for user in added])
+        self.assertEqual(["grunge@example.com"], [invitation.email for invitation in invitations])
+        self.assertEqual([["duder@testing.com"], ["grunge@example.com"]], [message.to for message in mail.outbox])
+        self.assertIn(invitations[0].token, mail.outbox[1].body)
+        self.assertFalse(User.objects.filter(email="grunge@example.com").exists())
+        # Inviting again reuses the pending invitation
+        added, again = InvitationBackend().invite_many(["grunge@example.com"], nirvana)
+        self.assertEqual([invitations[0].pk], [invitation.pk for invitation in again])
+
+    def test_accept_invitation(self):
+        org = Organization.objects.get(name="Foo Fighters")
+        invitation = OrganizationInvitation.create_many(org, ["krist@nirvana.com"])[0]
+        request = request_factory_login(self.factory, self.user)
+        self.assertEqual(302, InvitationBackend().accept_view(request, invitation.token).status_code)
+        self.assertTrue(org.organization_users.filter(user=self.user).exists())
+        with self.assertRaises(Http404):
+            InvitationBackend().accept_view(request, invitation.token)
+
+    def test_accept_invitation_for_another_email(self):
+        org = Organization.objects.get(name="Foo Fighters")
+        invitation = OrganizationInvitation.create_many(org, ["grunge@example.com"])[0]
+        request = request_factory_login(self.factory, self.user)
+        with self.assertRaises(PermissionDenied):
+            InvitationBackend().accept_view(request, invitation.token)
+        self.assertFalse(org.organization_users.filter(user=self.user).exists())
+
+    def test_accept_invitation_form(self):
+        org = Organization.objects.get(name="Foo Fighters")
+        invitation = OrganizationInvitation.create_many(org, ["grunge@example.com"])[0]
+        request = request_factory_login(self.factory)
+        self.assertEqual(200, InvitationBackend().accept_view(request, invitation.token).status_code)
+        OrganizationInvitation.objects.filter(pk=invitation.pk).update(expires=timezone.now())
+        with self.assertRaises(Http404):
+            InvitationBackend().accept_view(request, invitation.token)
+
+    def test_cleanup_invitations(self):
+        org = Organization.objects.get(name="Foo Fighters")
+        expired, pending = OrganizationInvitation.create_many(org, ["a@example.com", "b@example.com"])
+        OrganizationInvitation.objects.filter(pk=expired.pk).update(expires=timezone.now())
+        call_command("cleanup_invitations", stdout=StringIO())
+        self.assertEqual([pending.pk], list(OrganizationInvitation.objects.values_list("pk", flat=True)))
+
     def test_send_notification_inactive_user(self):
         """
         This test verifies that calling the send_notification function
@@ -110,6 +185,42 @@ class InvitationTests(TestCase):
             u"You've been added to an organization")
 
 
+@override_settings(USE_TZ=True)
+class SendManyTests(TestCase):
+
+    fixtures = ['users.json', 'orgs.json']
+
+    def setUp(self):
+        mail.outbox = []
+        self.sender = User.objects.get(username="dave")
+        self.users = list(User.objects.exclude(pk=self.sender.pk).order_by("pk"))
+        self.context = {'organization': Organization.objects.get(name="Nirvana"),
+                        'domain': Site.objects.get_current()}
+        self.templates = (InvitationBackend.notification_subject, InvitationBackend.notification_body)
+
+    def test_send_many(self):
+        sent = InvitationBackend().send_many(self.users, self.templates, self.context, sender=self.sender)
+        self.assertEqual(len(self.users), sent)
+        self.assertEqual([[user.email] for user in self.users], [message.to for message in mail.outbox])
+        self.assertTrue(all("Nirvana" in message.body for message in mail.outbox))
+
+    def test_templates_compiled_once(self):
+        backend = InvitationBackend()
+        with patch('organizations.backends.defaults.loader.get_template',
+                   wraps=loader.get_template) as get_template:
+            for user in self.users:
+                backend.send_notification(user, sender=self.sender, **self.context)
+            backend.send_many(self.users, self.templates, self.context)
+        self.assertEqual(2, get_template.call_count)
+        self.assertEqual(2 * len(self.users), len(mail.outbox))
+
+    @patch('organizations.app_settings.ORGS_EMAIL_OUTBOX', True)
+    def test_send_many_to_outbox(self):
+        InvitationBackend().send_many(self.users, self.templates, self.context)
+        self.assertEqual(0, len(mail.outbox))
+        self.assertEqual(len(self.users), OutgoingEmail.objects.count())
+
+
 @override_settings(USE_TZ=True)
 class RegistrationTests(TestCase):
 
@@ -203,3 +314,44 @@ class CustomModelBackend(TestCase):
         user = User.objects.create(username="183jkjd", email="akjdkj@kjdk.com")
         backend = InvitationBackend(org_model=CustomOrganization)
         backend.activate_organizations(user)
+
+
+@override_settings(USE_TZ=True)
+@patch('organizations.app_settings.ORGS_EMAIL_OUTBOX', True)
+class OutboxTests(TestCase):
+
+    fixtures = ['users.json', 'orgs.json']
+
+    def setUp(self):
+        mail.outbox = []
+
+    def run_worker(self):
+        call_command('run_org_mail_worker', '--once', '--threads', '2', '--batch-size', '1',
+                     stdout=StringIO())
+
+    def test_queue_and_send(self):
+        InvitationBackend().invite_by_email("sedgewick@example.com")
+        InvitationBackend().invite_by_email("other@example.com")
+        self.assertEqual(0, len(mail.outbox))
+        self.assertEqual(2, OutgoingEmail.objects.filter(status=OutgoingEmail.PENDING).count())
+        self.run_worker()
+        self.assertEqual(2, len(mail.outbox))
+        self.assertEqual(["other@example.com", "sedgewick@example.com"],
+                         sorted(message.to[0] for message in mail.outbox))
+        self.assertEqual(2, OutgoingEmail.objects.filter(status=OutgoingEmail.SENT).count())
+
+    def test_retry_with_backoff(self):
+        InvitationBackend().invite_by_email("sedgewick@example.com")
+        with patch('django.core.mail.backends.locmem.EmailBackend.send_messages',
+                   side_effect=IOError("Connection refused")):
+            self.run_worker()
+        email = OutgoingEmail.objects.get()
+        self.assertEqual((OutgoingEmail.PENDING, 1, "Connection refused"),
+                         (email.status, email.attempts, email.last_error))
+        self.assertTrue(email.next_attempt > timezone.now())
+        # Not due yet
+        self.run_worker()
+        self.assertEqual(0, len(mail.outbox))
+        OutgoingEmail.objects.update(next_attempt=timezone.now())
+        self.run_worker()
+        self.assertEqual(1, len(mail.outbox))
@@ -73,4 +73,6 @@ class OrgFormTests(TestCase):
                 'email': 'test_email@example.com',
                 'is_admin': False})
         self.assertTrue(form.is_valid())
-        form.save()
+        invitation = form.save()
+        self.assertEqual('test_email@example.com', invitation.email)
+        self.assertEqual(self.org, invitation.organization)
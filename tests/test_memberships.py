@@ -0,0 +1,150 @@
+from mock import Mock, patch
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.test.client import RequestFactory
+from django.test.utils import override_settings
+
+from organizations.cache import get_dashboard_context, invalidate_user
+from organizations.memberships import MembershipResolver, get_memberships
+from organizations.middleware import OrganizationMembershipMiddleware
+from organizations.models import Organization, OrganizationUser
+from .utils import request_factory_login
+
+
+@override_settings(USE_TZ=True)
+class MembershipResolverTests(TestCase):
+
+    fixtures = ['users.json', 'orgs.json']
+
+    def setUp(self):
+        self.kurt = User.objects.get(username="kurt")
+        self.krist = User.objects.get(username="krist")
+        self.nirvana = Organization.objects.get(name="Nirvana")
+        self.foo = Organization.objects.get(name="Foo Fighters")
+
+    def test_single_query(self):
+        resolver = MembershipResolver(self.kurt)
+        with self.assertNumQueries(1):
+            self.assertTrue(resolver.is_member(self.nirvana))
+            self.assertTrue(resolver.is_admin(self.nirvana))
+            self.assertTrue(resolver.is_owner(self.nirvana))
+            self.assertEqual(self.nirvana.pk, resolver.get(self.nirvana).organization_id)
+            self.assertFalse(resolver.is_member(self.foo))
+            self.assertIsNone(resolver.get(self.foo))
+
+    def test_admin_not_owner(self):
+        resolver = MembershipResolver(self.krist)
+        self.assertTrue(resolver.is_admin(self.nirvana))
+        self.assertFalse(resolver.is_owner(self.nirvana))
+
+    def test_reset(self):
+        resolver = get_memberships(self.krist)
+        self.assertFalse(resolver.is_member(self.foo))
+        self.foo.add_user(self.krist)
+        resolver.reset()
+        self.assertTrue(resolver.is_member(self.foo))
+
+    def test_cached_on_user(self):
+        self.assertIs(get_memberships(self.kurt), get_memberships(self.kurt))
+
+    def test_middleware(self):
+        request = request_factory_login(RequestFactory(), self.kurt)
+        OrganizationMembershipMiddleware().process_request(request)
+        self.assertTrue(request.organization_memberships.is_owner(self.nirvana))
+
+
+@override_settings(USE_TZ=True)
+@patch('organizations.app_settings.ORGS_MEMBERSHIP_CACHE', 'default')
+class MembershipCacheTests(TestCase):
+
+    fixtures = ['users.json', 'orgs.json']
+
+    def setUp(self):
+        cache.clear()
+        self.krist = User.objects.get(username="krist")
+        self.nirvana = Organization.objects.get(name="Nirvana")
+        self.foo = Organization.objects.get(name="Foo Fighters")
+
+    def test_served_from_cache(self):
+        self.assertTrue(MembershipResolver(self.krist).is_admin(self.nirvana))
+        with self.assertNumQueries(0):
+            self.assertTrue(MembershipResolver(self.krist).is_admin(self.nirvana))
+            self.assertFalse(MembershipResolver(self.krist).is_owner(self.nirvana))
+
+    def test_invalidated_by_membership_changes(self):
+        self.assertFalse(MembershipResolver(self.krist).is_member(self.foo))
+        self.foo.add_user(self.krist)
+        self.assertTrue(MembershipResolver(self.krist).is_member(self.foo))
+        self.foo.remove_user(self.krist)
+        self.assertFalse(MembershipResolver(self.krist).is_member(self.foo))
+
+    def test_invalidated_again_on_commit(self):
+        with patch('django.db.transaction.on_commit', create=True) as on_commit:
+            invalidate_user(self.krist.pk)
+        self.assertTrue(MembershipResolver(self.krist).is_admin(self.nirvana))
+        # Stands in for a concurrent request caching the rows from before the commit
+        OrganizationUser.objects.filter(organization=self.nirvana, user=self.krist).update(is_admin=False)
+        self.assertTrue(MembershipResolver(self.krist).is_admin(self.nirvana))
+        for args, kwargs in on_commit.call_args_list:
+            args[0]()
+        self.assertFalse(MembershipResolver(self.krist).is_admin(self.nirvana))
+
+    def test_invalidated_by_owner_change(self):
+        admin = self.nirvana.organization_users.get(user=self.krist)
+        self.assertFalse(MembershipResolver(self.krist).is_owner(self.nirvana))
+        self.nirvana.change_owner(admin)
+        self.assertTrue(MembershipResolver(self.krist).is_owner(self.nirvana))
+
+    def test_invalidated_by_organization_changes(self):
+        self.assertTrue(MembershipResolver(self.krist).is_member(self.nirvana))
+        self.nirvana.is_active = False
+        self.nirvana.save()
+        self.assertFalse(MembershipResolver(self.krist).is_member(self.nirvana))
+
+
+@override_settings(USE_TZ=True)
+@patch('organizations.app_settings.ORGS_DASHBOARD_CACHE', 'default')
+class DashboardCacheTests(TestCase):
+
+    fixtures = ['users.json', 'orgs.json']
+
+    def setUp(self):
+        cache.clear()
+        self.duder = User.objects.get(username="duder")
+        self.nirvana = Organization.objects.get(name="Nirvana")
+        self.context = {"chartdata1": {"y1": [1, 0, 0, 0]}}
+        self.loader = Mock(return_value=(self.context, True))
+
+    def charts(self, period="2017-05"):
+        return get_dashboard_context(self.nirvana.pk, 1, period, self.loader)
+
+    def test_served_from_cache(self):
+        self.assertEqual(self.context, self.charts())
+        self.assertEqual(self.context, self.charts())
+        self.assertEqual(1, self.loader.call_count)
+        self.charts("2017-06")
+        self.assertEqual(2, self.loader.call_count)
+
+    def test_invalidated_by_membership_changes(self):
+        self.charts()
+        self.nirvana.add_user(self.duder)
+        self.charts()
+        self.assertEqual(2, self.loader.call_count)
+        self.nirvana.remove_users([self.duder], batch_signal=True)
+        self.charts()
+        self.assertEqual(3, self.loader.call_count)
+
+    def test_incomplete_not_cached(self):
+        self.loader.return_value = (self.context, False)
+        self.assertEqual(self.context, self.charts())
+        self.charts()
+        self.assertEqual(2, self.loader.call_count)
+
+    def test_disabled(self):
+        # The class level patch would override a method decorator
+        with patch('organizations.app_settings.ORGS_DASHBOARD_CACHE', None):
+            self.charts()
+            self.charts()
+        self.assertEqual(2, self.loader.call_count)
@@ -8,6 +8,7 @@ from django.test.utils import override_settings
 from organizations.models import Organization, OrganizationUser
 from organizations.mixins import (OrganizationMixin, OrganizationUserMixin,
         MembershipRequiredMixin, AdminRequiredMixin, OwnerRequiredMixin)
+from test_abstract.models import CustomOrganization
 from .utils import request_factory_login
 
 
@@ -118,3 +119,23 @@ class AccessMixinTests(TestCase):
         with self.assertRaises(PermissionDenied):
             OwnerView().dispatch(self.dummy_request,
                                  organization_pk=self.nirvana.pk)
+
+    def test_custom_organization_access(self):
+        """Custom organizations aren't checked against default memberships sharing their pk"""
+        custom = CustomOrganization.objects.create(pk=self.nirvana.pk, name="Custom", slug="custom")
+        custom.add_user(self.dummy)
+
+        class CustomView(OrgView):
+            org_model = CustomOrganization
+
+        class AdminView(AdminRequiredMixin, CustomView):
+            pass
+
+        class OwnerView(OwnerRequiredMixin, CustomView):
+            pass
+
+        for view in (AdminView, OwnerView):
+            self.assertEqual(200, view().dispatch(self.dummy_request,
+                organization_pk=custom.pk).status_code)
+            with self.assertRaises(PermissionDenied):
+                view().dispatch(self.kurt_request, organization_pk=custom.pk)
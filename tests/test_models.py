@@ -1,7 +1,13 @@
 # -*- coding: utf-8 -*-
 
+import os
 from functools import partial
+try:
+    from io import StringIO
+except ImportError:
+    from StringIO import StringIO
 
+from mock import patch
 from django.db import IntegrityError
 from django.contrib.auth.models import User
 from django.test import TestCase
@@ -86,6 +92,58 @@ class OrgModelTests(TestCase):
         self.foo.remove_user(self.krist)
         self.assertFalse(self.foo.users.filter(pk=self.krist.pk).exists())
 
+    def test_add_users(self):
+        outcomes = self.foo.add_users([self.krist, self.duder.pk, self.dave, 9999])
+        self.assertEqual({self.krist.pk: 'added', self.duder.pk: 'added',
+                          self.dave.pk: 'existing', 9999: 'missing'}, outcomes)
+        self.assertTrue(self.foo.users.filter(pk=self.duder.pk).exists())
+        self.assertFalse(self.foo.organization_users.get(user=self.krist).is_admin)
+
+    def test_add_users_empty_org(self):
+        org = Organization.objects.create(name="Empty")
+        org.add_users([self.krist, self.duder])
+        self.assertTrue(org.is_owner(self.krist))
+        self.assertTrue(org.is_admin(self.krist))
+        self.assertFalse(org.organization_users.get(user=self.duder).is_admin)
+
+    def test_remove_users(self):
+        self.foo.add_users([self.krist, self.duder])
+        outcomes = self.foo.remove_users([self.krist.pk, self.duder, self.dave, self.kurt])
+        self.assertEqual({self.krist.pk: 'removed', self.duder.pk: 'removed',
+                          self.dave.pk: 'owner', self.kurt.pk: 'not_member'}, outcomes)
+        self.assertEqual([self.dave], list(self.foo.users.all()))
+
+    def test_remove_users_from_group_only(self):
+        sub = Organization.objects.create(name="Sub", parent=self.foo)
+        self.foo.add_users([self.krist, self.duder])
+        sub.add_users([self.krist])
+        outcomes = self.foo.remove_users([self.krist, self.dave], include_subgroups=False)
+        self.assertEqual({self.krist.pk: 'removed', self.dave.pk: 'owner'}, outcomes)
+        self.assertFalse(self.foo.has_member(self.krist))
+        self.assertTrue(sub.has_member(self.krist))
+
+    def test_member_selection(self):
+        from organizations.models import MemberSelection
+        selection = MemberSelection.create(self.foo, self.dave, ["2", "4", "2"])
+        self.assertEqual(32, len(selection.token))
+        self.assertEqual([2, 4], MemberSelection.objects.get(token=selection.token).get_user_ids())
+
+    def test_non_member_candidates(self):
+        self.assertEqual([self.duder], list(self.nirvana.non_member_candidates()))
+        self.assertEqual([self.krist, self.kurt, self.duder],
+                         list(self.foo.non_member_candidates().order_by("pk")))
+        self.duder.is_active = False
+        self.duder.save()
+        self.assertFalse(self.nirvana.non_member_candidates().exists())
+        self.assertEqual([self.duder], list(self.nirvana.non_member_candidates(is_active=None)))
+        with self.assertNumQueries(1):
+            list(self.nirvana.non_member_candidates())
+
+    def test_member_id_chunks(self):
+        ids = ["{0}".format(self.krist.pk), "{0}".format(self.kurt.pk)]
+        self.assertEqual([ids], list(self.nirvana.member_id_chunks()))
+        self.assertEqual([[ids[0]], [ids[1]]], list(self.nirvana.member_id_chunks(size=1)))
+        self.assertEqual([], list(Organization.objects.get(name="Scream").member_id_chunks()))
 
     def test_get_or_add_user(self):
         """Ensure `get_or_add_user` adds a user IFF it exists"""
@@ -125,6 +183,251 @@ class OrgModelTests(TestCase):
         self.assertRaises(OrganizationMismatch, self.nirvana.owner.save)
 
 
+@override_settings(USE_TZ=True)
+class OrgHierarchyTests(TestCase):
+
+    def setUp(self):
+        self.brand = Organization.objects.create(name="Brand")
+        self.club = Organization.objects.create(name="Club", parent=self.brand)
+        self.team = Organization.objects.create(name="Team", parent=self.club)
+        self.other = Organization.objects.create(name="Other brand")
+
+    def test_paths(self):
+        self.assertEqual("{0}/".format(self.brand.pk), self.brand.path)
+        self.assertEqual("{0}{1}/".format(self.club.path, self.team.pk), self.team.path)
+        self.assertEqual(0, self.brand.depth)
+        self.assertEqual(2, self.team.depth)
+
+    def test_ancestors(self):
+        self.assertEqual([self.brand, self.club], list(self.team.ancestors()))
+        self.assertEqual([self.team, self.club, self.brand],
+                         self.team.get_parents(include_self=True))
+        self.assertEqual([], list(self.brand.ancestors()))
+
+    def test_descendants(self):
+        self.assertEqual({self.club, self.team}, set(self.brand.descendants()))
+        self.assertEqual({self.brand, self.club, self.team}, set(self.brand.subtree()))
+        self.assertEqual([self.club], list(self.brand.get_subgroups()))
+
+    def test_reparent(self):
+        self.club.parent = self.other
+        self.club.save()
+        team = Organization.objects.get(pk=self.team.pk)
+        self.assertEqual("{0}{1}/{2}/".format(self.other.path, self.club.pk, self.team.pk), team.path)
+        self.assertEqual(2, team.depth)
+        self.assertEqual(set(), set(self.brand.descendants()))
+
+    def test_reparent_under_subgroup(self):
+        from organizations.exceptions import HierarchyError
+        self.brand.parent = self.team
+        self.assertRaises(HierarchyError, self.brand.save)
+
+    def test_remove_user_from_subtree(self):
+        user = User.objects.create_user("hierarchy", email="hierarchy@example.com", password="test")
+        other = User.objects.create_user("other", email="other@example.com", password="test")
+        for org in (self.brand, self.club, self.team, self.other):
+            org.add_user(other)
+            org.add_user(user)
+        self.assertEqual(sorted([self.club.pk, self.team.pk]), self.club.remove_user(user))
+        self.assertEqual([self.brand, self.other],
+                         list(Organization.objects.filter(users=user).order_by("pk")))
+        self.assertEqual(4, Organization.objects.filter(users=other).count())
+
+    def test_add_user_to_unique_subgroup(self):
+        user = User.objects.create_user("unique", email="unique@example.com", password="test")
+        sibling = Organization.objects.create(name="Sibling", parent=self.brand)
+        for org in (self.brand, self.club, self.team):
+            org.add_user(user)
+        sibling.add_user_to_unique_subgroup(user)
+        self.assertEqual([self.brand, sibling],
+                         list(Organization.objects.filter(users=user).order_by("pk")))
+
+    def test_add_user_to_unique_parent_group(self):
+        from django.contrib.sites.models import Site
+        site = Site.objects.get_current()
+        Organization.objects.filter(pk__in=[self.brand.pk, self.other.pk]).update(site=site)
+        self.other.site = site
+        user = User.objects.create_superuser("unique", "unique@example.com", "test")
+        self.team.add_user(user)
+        self.brand.add_user(user)
+        self.other.add_user_to_unique_parent_group(user, site, is_admin=True)
+        self.assertEqual([self.other], list(Organization.objects.filter(users=user)))
+        self.assertTrue(self.other.organization_users.get(user=user).is_admin)
+
+    def test_delete_parent(self):
+        self.club.delete()
+        team = Organization.objects.get(pk=self.team.pk)
+        self.assertEqual("{0}/".format(team.pk), team.path)
+        self.assertEqual(0, team.depth)
+
+    def test_delete_root(self):
+        self.brand.delete()
+        club = Organization.objects.get(pk=self.club.pk)
+        team = Organization.objects.get(pk=self.team.pk)
+        self.assertEqual(("{0}/".format(club.pk), 0), (club.path, club.depth))
+        self.assertEqual(("{0}/{1}/".format(club.pk, team.pk), 1), (team.path, team.depth))
+        self.assertEqual([team], list(club.descendants()))
+
+    def test_rebuild_paths(self):
+        from django.core.management import call_command
+        Organization.objects.filter(pk=self.brand.pk).delete()
+        call_command('rebuild_organization_paths', stdout=StringIO())
+        team = Organization.objects.get(pk=self.team.pk)
+        self.assertEqual(("{0}/{1}/".format(self.club.pk, team.pk), 1), (team.path, team.depth))
+        self.assertEqual(0, Organization.rebuild_paths())
+
+
+@override_settings(USE_TZ=True)
+class OrgCountTests(TestCase):
+
+    fixtures = ['users.json', 'orgs.json']
+
+    def setUp(self):
+        Organization.recount()
+        self.krist = User.objects.get(username="krist")
+        self.duder = User.objects.get(username="duder")
+        self.foo = Organization.objects.get(name="Foo Fighters")
+
+    def assertCounts(self, members, admins):
+        org = Organization.objects.get(pk=self.foo.pk)
+        self.assertEqual((members, admins), (org.member_count, org.admin_count))
+
+    def test_recount(self):
+        self.assertCounts(1, 1)
+        Organization.objects.filter(pk=self.foo.pk).update(member_count=10)
+        self.assertEqual(1, Organization.recount())
+        self.assertCounts(1, 1)
+
+    def test_recount_command(self):
+        from django.core.management import call_command
+        Organization.objects.filter(pk=self.foo.pk).update(admin_count=0)
+        call_command('recount_organizations', str(self.foo.pk), stdout=StringIO())
+        self.assertCounts(1, 1)
+
+    def test_add_and_remove(self):
+        self.foo.add_user(self.krist, is_admin=True)
+        self.assertCounts(2, 2)
+        self.foo.remove_user(self.krist)
+        self.assertCounts(1, 1)
+
+    def test_bulk_add_and_remove(self):
+        self.foo.add_users([self.krist, self.duder])
+        self.assertCounts(3, 1)
+        self.foo.remove_users([self.krist, self.duder])
+        self.assertCounts(1, 1)
+
+    def test_deleting_users(self):
+        self.foo.add_users([self.krist, self.duder])
+        self.foo.organization_users.filter(user=self.krist).update(is_admin=True)
+        Organization.recount()
+        User.objects.filter(pk__in=[self.krist.pk, self.duder.pk]).delete()
+        self.assertCounts(1, 1)
+
+    def test_batched_counts(self):
+        with Organization.batched_counts():
+            Organization.adjust_counts({self.foo.pk: (2, 1)})
+            Organization.adjust_counts({self.foo.pk: (1, 0)})
+            self.assertCounts(1, 1)
+        self.assertCounts(4, 2)
+
+    @patch('organizations.models.DELETE_BATCH_SIZE', 1)
+    def test_batched_remove_users(self):
+        self.foo.add_users([self.krist, self.duder])
+        outcomes = self.foo.remove_users([self.krist, self.duder])
+        self.assertEqual({self.krist.pk: "removed", self.duder.pk: "removed"}, outcomes)
+        self.assertFalse(self.foo.organization_users.filter(user__in=[self.krist, self.duder]).exists())
+        self.assertCounts(1, 1)
+
+    def test_change_admin(self):
+        org_user = self.foo.add_user(self.krist)
+        org_user.is_admin = True
+        org_user.save()
+        self.assertCounts(2, 2)
+        org_user.delete()
+        self.assertCounts(1, 1)
+
+
+@override_settings(USE_TZ=True)
+class ImportMembershipsTests(TestCase):
+
+    fixtures = ['users.json', 'orgs.json']
+
+    def setUp(self):
+        import tempfile
+        Organization.recount()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "members.csv")
+        with open(self.path, "w") as f:
+            f.write("organization,email,role\n"
+                    "foo-fighters,krist@nirvana.com,admin\n"
+                    "nirvana,krist@nirvana.com,member\n"
+                    "missing,krist@nirvana.com,member\n"
+                    "foo-fighters,nobody@example.com,member\n"
+                    "foo-fighters,duder@testing.com,\n")
+        self.foo = Organization.objects.get(slug="foo-fighters")
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.directory)
+
+    def call(self, *args):
+        from django.core.management import call_command
+        out = StringIO()
+        call_command('import_memberships', self.path, stdout=out, stderr=StringIO(), *args)
+        return out.getvalue()
+
+    def test_dry_run(self):
+        out = self.call('--dry-run')
+        self.assertIn("+ foo-fighters krist@nirvana.com admin", out)
+        self.assertIn("~ nirvana krist@nirvana.com admin -> member", out)
+        self.assertIn("2 added, 1 updated, 0 unchanged, 2 errors", out)
+        self.assertEqual(1, self.foo.organization_users.count())
+
+    def test_import(self):
+        self.call('--chunk-size', '2')
+        self.assertTrue(self.foo.organization_users.get(user__username="krist").is_admin)
+        self.assertFalse(self.foo.organization_users.get(user__username="duder").is_admin)
+        self.assertFalse(OrganizationUser.objects.get(
+            organization__slug="nirvana", user__username="krist").is_admin)
+        foo = Organization.objects.get(pk=self.foo.pk)
+        self.assertEqual((3, 2), (foo.member_count, foo.admin_count))
+        self.assertFalse(os.path.exists(self.path + ".checkpoint"))
+
+    def test_import_new_group(self):
+        Organization.objects.create(name="Empty", slug="empty", external_id="club-7")
+        with open(self.path, "w") as f:
+            f.write("organization,email\nclub-7,duder@testing.com\nempty,krist@nirvana.com\n")
+        self.call()
+        empty = Organization.objects.get(slug="empty")
+        self.assertTrue(empty.is_owner(User.objects.get(username="duder")))
+        self.assertEqual(2, empty.organization_users.count())
+
+    def test_emails_match_case_insensitively(self):
+        with open(self.path, "w") as f:
+            f.write("organization,email\nfoo-fighters,Duder@Testing.COM\n")
+        self.call()
+        self.assertTrue(self.foo.organization_users.filter(user__username="duder").exists())
+
+    @patch('organizations.app_settings.ORGS_MEMBERSHIP_CACHE', 'default')
+    def test_role_changes_invalidate_cache(self):
+        from django.core.cache import cache
+        from organizations.memberships import MembershipResolver
+        cache.clear()
+        krist = User.objects.get(username="krist")
+        nirvana = Organization.objects.get(slug="nirvana")
+        self.assertTrue(MembershipResolver(krist).is_admin(nirvana))
+        self.call()
+        self.assertFalse(MembershipResolver(krist).is_admin(nirvana))
+
+    def test_resume(self):
+        with open(self.path + ".checkpoint", "w") as f:
+            f.write("4")
+        out = self.call()
+        self.assertIn("Resuming after row 4", out)
+        self.assertEqual(["dave", "duder"], sorted(
+            self.foo.organization_users.values_list("user__username", flat=True)))
+
+
 @override_settings(USE_TZ=True)
 class OrgDeleteTests(TestCase):
 
@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils.timezone import utc
+
+from organizations.models import Organization
+from organizations.pagination import CursorPaginator, decode_cursor, encode_cursor
+
+
+@override_settings(USE_TZ=True)
+class CursorPaginatorTests(TestCase):
+
+    fixtures = ['users.json', 'orgs.json']
+
+    def setUp(self):
+        self.users = User.objects.all()
+        # Shared first names exercise the primary key tie-breaker
+        self.users.filter(username__in=["krist", "kurt"]).update(first_name="Same")
+
+    def walk(self, paginator):
+        pages, cursor = [], None
+        # Bounded, so a cursor that doesn't move forward fails instead of looping
+        for _ in range(self.users.count() + 1):
+            page = paginator.page(cursor)
+            pages.append([user.pk for user in page])
+            if not page.has_next():
+                return pages
+            cursor = page.next_cursor
+        self.fail("The cursors never reached the last page")
+
+    def test_cursor_round_trip(self):
+        self.assertEqual(("Same", 3, True), decode_cursor(encode_cursor("Same", 3, True)))
+        self.assertEqual(None, decode_cursor("not a cursor"))
+        moment = datetime(2016, 1, 2, 3, 4, 5, 123456, tzinfo=utc)
+        self.assertEqual((moment, 3, False), decode_cursor(encode_cursor(moment, 3)))
+
+    def test_microsecond_sort_values(self):
+        start = datetime(2016, 1, 2, 3, 4, 5, tzinfo=utc)
+        for offset, pk in enumerate(self.users.order_by("-pk").values_list("pk", flat=True)):
+            # All within one millisecond
+            self.users.filter(pk=pk).update(last_login=start + timedelta(microseconds=offset + 1))
+        for sort_field in ["last_login", "-last_login"]:
+            tie_breaker = "-pk" if sort_field.startswith("-") else "pk"
+            expected = list(self.users.order_by(sort_field, tie_breaker).values_list("pk", flat=True))
+            pages = self.walk(CursorPaginator(self.users, sort_field, per_page=1))
+            self.assertEqual(expected, [pk for page in pages for pk in page])
+
+    def test_pages_match_ordering(self):
+        for sort_field in ["first_name", "-first_name", "pk", "-username"]:
+            tie_breaker = "-pk" if sort_field.startswith("-") else "pk"
+            expected = list(self.users.order_by(sort_field, tie_breaker).values_list("pk", flat=True))
+            pages = self.walk(CursorPaginator(self.users, sort_field, per_page=1))
+            self.assertEqual(expected, [pk for page in pages for pk in page])
+            self.assertTrue(all(len(page) == 1 for page in pages))
+
+    def test_nullable_sort_field(self):
+        self.users.filter(username__in=["krist", "duder"]).update(last_login=None)
+        for sort_field in ["last_login", "-last_login"]:
+            paginator = CursorPaginator(self.users, sort_field, per_page=1)
+            pages = self.walk(paginator)
+            pks = [pk for page in pages for pk in page]
+            self.assertEqual(sorted(self.users.values_list("pk", flat=True)), sorted(pks))
+            nulls = [pk for pk in pks if pk in (2, 4)]
+            self.assertEqual([2, 4] if sort_field == "last_login" else [4, 2], nulls)
+            # Walking back from the last page returns the same rows
+            page, backwards = paginator.page(), []
+            while page.has_next():
+                page = paginator.page(page.next_cursor)
+            while page.has_previous():
+                page = paginator.page(page.previous_cursor)
+                backwards.insert(0, [user.pk for user in page])
+            self.assertEqual(pages[:-1], backwards)
+
+    def test_previous_page(self):
+        paginator = CursorPaginator(self.users, "first_name", per_page=2)
+        first = paginator.page()
+        self.assertFalse(first.has_previous())
+        second = paginator.page(first.next_cursor)
+        self.assertTrue(second.has_previous())
+        self.assertEqual(list(first), list(paginator.page(second.previous_cursor)))
+
+    def test_invalid_cursor_is_first_page(self):
+        paginator = CursorPaginator(self.users, "first_name", per_page=2)
+        self.assertEqual(list(paginator.page()), list(paginator.page("garbage")))
+
+    def test_totals(self):
+        nirvana = Organization.objects.get(name="Nirvana")
+        members = nirvana.organization_users.all()
+        page = CursorPaginator(members, "user__first_name", total=members.count).page()
+        with self.assertNumQueries(1):
+            self.assertEqual(3, page.total)
+        page = CursorPaginator(members, "user__first_name", total=nirvana.member_count).page()
+        with self.assertNumQueries(0):
+            page.total
+        self.assertEqual(None, CursorPaginator(members).page().total)
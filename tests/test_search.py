@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.contrib.auth.models import User
+from django.contrib.sites.models import Site
+from django.core.management import call_command
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils.six import StringIO
+
+from organizations.models import Organization, UserSearchToken
+from organizations.search import search_users, user_tokens, words
+
+
+class TokenTests(TestCase):
+
+    def test_words(self):
+        self.assertEqual(["jose", "grohl", "foo", "com"], words("José GROHL <grohl@foo.com>"))
+
+    def test_words_are_distinct(self):
+        self.assertEqual(["dave", "grohl"], words("Dave Grohl dave GROHL"))
+
+    def test_user_tokens(self):
+        user = User(first_name="Dave", last_name="", email="dg@x.io")
+        self.assertEqual({"d", "da", "dav", "dave", "dg", "x", "i", "io"}, user_tokens(user))
+
+
+@override_settings(USE_TZ=True)
+class SearchTests(TestCase):
+
+    fixtures = ['users.json', 'orgs.json']
+
+    def setUp(self):
+        call_command("rebuild_user_search_index", stdout=StringIO())
+        self.nirvana = Organization.objects.get(name="Nirvana")
+        self.kurt = User.objects.get(username="kurt")
+        self.krist = User.objects.get(username="krist")
+
+    def test_search_members(self):
+        members = self.nirvana.organization_users.all()
+        self.assertEqual([self.kurt.pk], list(
+            search_users(members, "cob", "user").values_list("user_id", flat=True)))
+        self.assertEqual([self.kurt.pk], list(
+            search_users(members, "kurt cobain", "user").values_list("user_id", flat=True)))
+        self.assertFalse(search_users(members, "kurt nobody", "user").exists())
+
+    def test_empty_search_matches_all(self):
+        self.assertEqual(User.objects.count(), search_users(User.objects.all(), " ").count())
+
+    def test_search_by_site(self):
+        site = Site.objects.get(pk=1)
+        UserSearchToken.objects.filter(user=self.krist).update(site=site)
+        self.assertEqual([self.krist], list(search_users(User.objects.all(), "nirvana", site=site)))
+        self.assertEqual(2, search_users(User.objects.all(), "nirvana").count())
+
+    def test_user_changes_are_indexed(self):
+        self.krist.email = "bass@nirvana.example"
+        self.krist.save()
+        self.assertEqual([self.krist], list(search_users(User.objects.all(), "bass")))
+
+    def test_unrelated_saves_keep_tokens(self):
+        UserSearchToken.objects.filter(user=self.krist).delete()
+        self.krist.save(update_fields=["last_login"])
+        self.assertFalse(UserSearchToken.objects.filter(user=self.krist).exists())
+        self.krist.save(update_fields=["email"])
+        self.assertTrue(UserSearchToken.objects.filter(user=self.krist).exists())
+
+    def test_new_members_are_indexed(self):
+        UserSearchToken.objects.all().delete()
+        duder = User.objects.get(username="duder")
+        self.nirvana.add_user(duder)
+        self.assertTrue(UserSearchToken.objects.filter(user=duder).exists())
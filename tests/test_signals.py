@@ -6,7 +6,7 @@ from django.test import TestCase
 from django.test.utils import override_settings
 
 from organizations.models import Organization
-from organizations.signals import (user_added, user_removed,
+from organizations.signals import (user_added, user_removed, users_removed,
                                    owner_changed)
 
 
@@ -48,6 +48,17 @@ class SignalsTestCase(TestCase):
 
             self.assertEqual(add_receiver.call_args_list, [])
 
+    def test_users_removed_batched(self):
+        self.foo.add_users([self.krist, self.duder])
+        with mock_signal_receiver(user_removed) as remove_receiver:
+            with mock_signal_receiver(users_removed) as batch_receiver:
+                self.foo.remove_users([self.krist, self.duder], batch_signal=True)
+
+                self.assertEqual(remove_receiver.call_args_list, [])
+                self.assertEqual(batch_receiver.call_args_list, [
+                    call(signal=users_removed, sender=self.foo, users=[self.krist, self.duder]),
+                ])
+
     def test_user_removed_called(self):
 
         with mock_signal_receiver(user_removed) as remove_receiver:
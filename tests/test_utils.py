@@ -1,11 +1,14 @@
+import threading
 from functools import partial
 
+from mock import patch
+
 from django.test import TestCase
 from django.contrib.auth.models import User
 from django.test.utils import override_settings
 
 from organizations.models import Organization
-from organizations.utils import create_organization, model_field_attr
+from organizations.utils import create_organization, map_concurrently, model_field_attr
 from test_accounts.models import Account
 from test_abstract.models import CustomOrganization
 
@@ -71,3 +74,46 @@ class AttributeUtilTests(TestCase):
     def test_absent_attr(self):
         self.assertRaises(AttributeError, model_field_attr, User, 'username',
             'mariopoints')
+
+
+class MapConcurrentlyTests(TestCase):
+
+    def test_results_in_order(self):
+        self.assertEqual([0, 2, 4, 6], map_concurrently(lambda x: x * 2, range(4), 2, 5))
+        self.assertEqual([], map_concurrently(lambda x: x, [], 2, 5))
+
+    def test_calls_overlap(self):
+        lock, started, all_started = threading.Lock(), [], threading.Event()
+
+        def call(x):
+            with lock:
+                started.append(x)
+                if len(started) == 4:
+                    all_started.set()
+            # Only returns True if the other calls start while this one runs
+            return all_started.wait(5)
+        self.assertEqual([True] * 4, map_concurrently(call, range(4), 4, 10))
+
+    def test_partial_results(self):
+        released = threading.Event()
+        main = threading.current_thread()
+        # The main thread's clock passes the deadline after the first two
+        # results are collected; the workers' clock never moves
+        main_times = iter([0, 0, 0, 10])
+
+        def clock():
+            return next(main_times) if threading.current_thread() is main else 0
+
+        def slow(x):
+            if x == 1:
+                raise ValueError(x)
+            if x == 2:
+                released.wait(5)
+            return x
+        with patch('organizations.utils.time') as fake_time:
+            fake_time.time.side_effect = clock
+            try:
+                results = map_concurrently(slow, [0, 1, 2], 3, 5)
+            finally:
+                released.set()
+        self.assertEqual([0, None, None], results)
@@ -1,15 +1,24 @@
+import json
+import time
+from datetime import datetime
+from multiprocessing.pool import ThreadPool
+
+from mock import Mock, patch
+
 from django.contrib.auth.models import User
 from django.http import Http404
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase
 from django.test.client import RequestFactory
 from django.test.utils import override_settings
+from django.utils.timezone import utc
 
-from organizations.models import Organization
+from organizations.models import Organization, OrganizationInvitation
 from organizations.views import (BaseOrganizationList, BaseOrganizationDetail,
         BaseOrganizationCreate, BaseOrganizationUpdate, BaseOrganizationDelete,
         BaseOrganizationUserList, BaseOrganizationUserDetail,
         BaseOrganizationUserCreate, BaseOrganizationUserUpdate,
-        BaseOrganizationUserDelete, OrganizationSignup)
+        BaseOrganizationUserDelete, BaseOrganizationUserExport, OrganizationDashboard,
+        OrganizationSignup)
 from .utils import request_factory_login
 
 
@@ -71,6 +80,26 @@ class BaseViewTests(TestCase):
             request=self.kurt_request, kwargs=kwargs).get(self.kurt_request,
                 **kwargs).status_code)
 
+    def test_user_export(self):
+        kwargs = {'organization_pk': self.nirvana.pk}
+        request = request_factory_login(RequestFactory(), self.kurt)
+        response = BaseOrganizationUserExport(request=request, kwargs=kwargs).get(request, **kwargs)
+        lines = b"".join(response.streaming_content).decode("utf-8").splitlines()
+        self.assertEqual("user,email,is_admin,is_moderator,date_created,site", lines[0])
+        self.assertEqual(self.nirvana.get_members(same_site_only=False).count() + 1, len(lines))
+
+        request.GET = {"format": "jsonl"}
+        view = BaseOrganizationUserExport(request=request, kwargs=kwargs)
+        view.chunk_size = 1
+        rows = [json.loads(line.decode("utf-8")) for line in view.get(request, **kwargs).streaming_content]
+        self.assertEqual(["krist", "kurt"], sorted(row["user"] for row in rows))
+        # The test users have no profile to read a site from
+        self.assertEqual([None, None], [row["site"] for row in rows])
+
+        request.GET = {"format": "xml"}
+        self.assertEqual(400, BaseOrganizationUserExport(request=request, kwargs=kwargs).get(
+            request, **kwargs).status_code)
+
     def test_user_detail(self):
         kwargs = {'organization_pk': self.nirvana.pk, 'user_pk': self.kurt.pk}
         self.assertEqual(200, BaseOrganizationUserDetail(
@@ -89,6 +118,15 @@ class BaseViewTests(TestCase):
             request=self.kurt_request, kwargs=kwargs).get(self.kurt_request,
                 **kwargs).status_code)
 
+    def test_user_create_invitation(self):
+        kwargs = {'organization_pk': self.nirvana.pk}
+        request = self.factory.post("/", {"email": "grunge@example.com"})
+        request.user = self.kurt
+        response = BaseOrganizationUserCreate(request=request, kwargs=kwargs).post(request, **kwargs)
+        self.assertEqual(302, response.status_code)
+        self.assertTrue(OrganizationInvitation.objects.filter(
+            organization=self.nirvana, email="grunge@example.com").exists())
+
     def test_user_update(self):
         kwargs = {'organization_pk': self.nirvana.pk, 'user_pk': self.kurt.pk}
         self.assertEqual(200, BaseOrganizationUserUpdate(
@@ -108,3 +146,48 @@ class BaseViewTests(TestCase):
                 self.kurt_request).status_code)
         self.assertEqual(200,
             OrganizationSignup(request=self.anon_request).dispatch(self.anon_request).status_code)
+
+
+def month_statistics(tcprofile, activity, organization, brand, start):
+    time.sleep(0.01)  # Let the requests interleave
+    return Mock(url=activity.url, period=start)
+
+
+@patch('organizations.views.Site')
+@patch('organizations.views.ActivityStatistics')
+@patch('organizations.views.mycoracle_forms')
+@patch('organizations.views.mycoracle_utils')
+@patch('organizations.views.month_statistics', side_effect=month_statistics)
+@patch('organizations.views.moderated_activities',
+       side_effect=lambda organization, site: [Mock(active=True, url="one"), Mock(active=True, url="two")])
+class DashboardConcurrencyTests(SimpleTestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.organization = Mock()
+        self.organization.get_members.return_value.count.return_value = 3
+
+    def dashboard(self, month):
+        request = self.factory.post("/", {"month": month, "year": 2016})
+        request.user = Mock()
+        view = OrganizationDashboard(request=request, args=(), kwargs={})
+        view.organization = self.organization
+        view.render_to_response = lambda context: context
+        return view.post(request, ap_repo=Mock())
+
+    def test_concurrent_requests(self, *mocks):
+        """Requests for different periods running at once each see only their own"""
+        months = list(range(1, 13)) * 8
+        pool = ThreadPool(16)
+        try:
+            contexts = pool.map(self.dashboard, months)
+        finally:
+            pool.close()
+            pool.join()
+        for month, context in zip(months, contexts):
+            start = datetime(2016, month, 1, tzinfo=utc)
+            self.assertEqual(start, context["start"])
+            self.assertEqual(start.strftime("%b %Y"), context["period_start"])
+            self.assertEqual(["one", "two"], [act.url for act in context["acts"]])
+            self.assertEqual([start, start], [act.period for act in context["acts"]])
+            self.assertEqual([3, 3], [act.total_users for act in context["acts"]])